@@ -61,11 +61,15 @@ class UserProfileForm(forms.ModelForm):
 
     def save(self, commit=True):
         profile = super().save(commit=False)
-        
-        self.user_instance.username = self.cleaned_data['username']
-        self.user_instance.first_name = self.cleaned_data['first_name']
-        self.user_instance.save()
-        
-        if commit:
+
+        # Only write the rows whose fields were actually edited
+        user_fields = [name for name in ('username', 'first_name') if name in self.changed_data]
+        if user_fields:
+            for name in user_fields:
+                setattr(self.user_instance, name, self.cleaned_data[name])
+            self.user_instance.save(update_fields=user_fields)
+
+        profile_changed = any(name in self.changed_data for name in ('bio', 'avatar'))
+        if commit and (profile._state.adding or profile_changed):
             profile.save()
-        return profile
\ No newline at end of file
+        return profile
@@ -0,0 +1,151 @@
+# accounts/mail.py
+from datetime import timedelta
+from email import message_from_bytes
+from email.message import Message
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.mail.message import MIMEMixin
+from django.db import transaction
+from django.utils import timezone
+from .models import OutgoingEmail
+
+
+class OutboxBackend(BaseEmailBackend):
+    """
+    Email backend that only writes messages to the OutgoingEmail table.
+    Delivery happens out of band in ``manage.py run_mail_worker``, so a slow
+    SMTP server never holds up a request. The rendered MIME message is
+    stored whole, so attachments and every alternative are delivered as
+    queued; the other columns are for the admin and the envelope.
+    """
+
+    def send_messages(self, email_messages):
+        rows = [self._to_row(message) for message in email_messages]
+        OutgoingEmail.objects.bulk_create(rows)
+        return len(rows)
+
+    @staticmethod
+    def _to_row(message):
+        html_body = ''
+        for content, mimetype in getattr(message, 'alternatives', []):
+            if mimetype == 'text/html':
+                html_body = content
+                break
+        return OutgoingEmail(
+            subject=message.subject,
+            body=message.body,
+            html_body=html_body,
+            from_email=message.from_email or '',
+            to=list(message.to),
+            cc=list(message.cc),
+            bcc=list(message.bcc),
+            reply_to=list(message.reply_to),
+            headers=dict(message.extra_headers),
+            mime=message.message().as_bytes(),
+        )
+
+
+class StoredMIME(MIMEMixin, Message):
+    """OutgoingEmail.mime parsed back, serialized the way Django's own are"""
+
+
+class QueuedMessage(EmailMultiAlternatives):
+    """Sends the MIME message stored at queue time rather than re-rendering"""
+    mime = b''
+
+    def message(self):
+        if not self.mime:
+            # Queued before OutgoingEmail.mime existed
+            return super().message()
+        return message_from_bytes(self.mime, _class=StoredMIME)
+
+
+def build_message(email, connection=None):
+    message = QueuedMessage(
+        subject=email.subject,
+        body=email.body,
+        from_email=email.from_email or None,
+        to=email.to,
+        cc=email.cc,
+        bcc=email.bcc,
+        reply_to=email.reply_to,
+        headers=email.headers,
+        connection=connection,
+    )
+    if email.html_body:
+        message.attach_alternative(email.html_body, 'text/html')
+    message.mime = bytes(email.mime)
+    return message
+
+
+def claim_batch(batch_size):
+    """
+    Lease the next due emails to this worker by pushing their next attempt
+    past the lease window; other workers skip the locked rows meanwhile.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            OutgoingEmail.objects.select_for_update(skip_locked=True)
+            .filter(status=OutgoingEmail.PENDING, next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        OutgoingEmail.objects.filter(id__in=ids).update(
+            next_attempt_at=now + timedelta(seconds=settings.OUTBOX_LEASE_SECONDS)
+        )
+    return list(OutgoingEmail.objects.filter(id__in=ids))
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=settings.OUTBOX_RETRY_BACKOFF * 2 ** (attempts - 1))
+
+
+def record_failure(email, error):
+    """Count a failed attempt; back off, or give up after OUTBOX_MAX_ATTEMPTS"""
+    email.attempts += 1
+    email.last_error = str(error)
+    if email.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+        email.status = OutgoingEmail.FAILED
+    else:
+        email.next_attempt_at = timezone.now() + retry_delay(email.attempts)
+    email.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at'])
+
+
+def deliver_pending(batch_size=None):
+    """
+    Send one batch of due emails over a single connection to the delivery
+    backend. Returns ``(sent, failed)`` counts for the batch.
+    """
+    emails = claim_batch(batch_size or settings.OUTBOX_BATCH_SIZE)
+    if not emails:
+        return 0, 0
+
+    connection = get_connection(settings.OUTBOX_DELIVERY_BACKEND)
+    try:
+        connection.open()
+    except Exception as e:
+        # Server down or login rejected: the whole batch failed this attempt
+        for email in emails:
+            record_failure(email, e)
+        return 0, len(emails)
+
+    sent = failed = 0
+    try:
+        for email in emails:
+            try:
+                connection.send_messages([build_message(email, connection)])
+            except Exception as e:
+                failed += 1
+                record_failure(email, e)
+            else:
+                sent += 1
+                email.status = OutgoingEmail.SENT
+                email.sent_at = timezone.now()
+                email.save(update_fields=['status', 'sent_at'])
+    finally:
+        connection.close()
+
+    return sent, failed
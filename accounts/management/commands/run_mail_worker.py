@@ -0,0 +1,45 @@
+import logging
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from accounts.mail import deliver_pending
+
+logger = logging.getLogger('accounts.mail')
+
+
+class Command(BaseCommand):
+    help = "Deliver queued outbox emails in batches over one SMTP connection per batch"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help="Drain the queue once and exit instead of polling forever",
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=settings.OUTBOX_BATCH_SIZE,
+            help="Emails sent per SMTP connection",
+        )
+        parser.add_argument(
+            '--interval', type=float, default=settings.OUTBOX_POLL_INTERVAL,
+            help="Seconds to sleep when the queue is empty",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            try:
+                sent, failed = deliver_pending(options['batch_size'])
+            except Exception:
+                # e.g. the database went away; claimed emails are retried
+                # once their lease runs out
+                logger.exception("Delivering a batch of outbox emails failed")
+                if options['once']:
+                    raise
+                time.sleep(options['interval'])
+                continue
+            if sent or failed:
+                self.stdout.write(f"Sent {sent}, failed {failed}")
+                continue
+            if options['once']:
+                break
+            time.sleep(options['interval'])
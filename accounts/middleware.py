@@ -0,0 +1,129 @@
+"""
+Resolve ``request.user`` with its profile from the cache.
+
+AuthenticationMiddleware costs a user SELECT on every authenticated
+request, and base.html follows up with a ``user.profile`` SELECT for the
+avatar and dark mode. CachedUserMiddleware replaces its lazy user with one
+that loads both in a single ``select_related`` query and keeps the pair in
+the cache for SESSION_USER_CACHE_TIMEOUT. accounts.signals drops the
+entry whenever the User or Profile is saved or deleted, or the user's
+groups or permissions change; the short timeout bounds how long a change
+made behind the signals' back (a queryset ``update()``) goes unseen.
+"""
+from functools import partial
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.utils.crypto import constant_time_compare
+from django.utils.functional import SimpleLazyObject
+
+USER_KEY_PREFIX = 'session-user:'
+
+
+def user_cache_key(user_id):
+    return f"{USER_KEY_PREFIX}{user_id}"
+
+
+def forget_user(user_id):
+    cache.delete(user_cache_key(user_id))
+
+
+def get_cached_user(request):
+    """
+    The session's user with ``profile`` already attached. Anything unusual
+    (unknown backend, stale session hash, inactive user) is handed to
+    ``django.contrib.auth.get_user`` so its flushing and fallback-secret
+    handling still apply.
+    """
+    try:
+        user_id = User._meta.pk.to_python(request.session[SESSION_KEY])
+        backend_path = request.session[BACKEND_SESSION_KEY]
+    except KeyError:
+        return auth.get_user(request)
+    if backend_path not in settings.AUTHENTICATION_BACKENDS:
+        return auth.get_user(request)
+
+    key = user_cache_key(user_id)
+    user = cache.get(key)
+    if user is None:
+        user = User.objects.select_related('profile').filter(pk=user_id).first()
+        if user is None:
+            return auth.get_user(request)
+        cache.set(key, user, settings.SESSION_USER_CACHE_TIMEOUT)
+
+    session_hash = request.session.get(HASH_SESSION_KEY)
+    if not (user.is_active and session_hash and
+            constant_time_compare(session_hash, user.get_session_auth_hash())):
+        return auth.get_user(request)
+
+    user.backend = backend_path
+    return user
+
+
+async def aget_cached_user(request):
+    """``get_cached_user()`` without blocking the event loop"""
+    try:
+        user_id = User._meta.pk.to_python(await request.session.aget(SESSION_KEY))
+        backend_path = await request.session.aget(BACKEND_SESSION_KEY)
+    except (KeyError, TypeError, ValueError):
+        return await auth.aget_user(request)
+    if user_id is None or backend_path not in settings.AUTHENTICATION_BACKENDS:
+        return await auth.aget_user(request)
+
+    key = user_cache_key(user_id)
+    user = await cache.aget(key)
+    if user is None:
+        user = await User.objects.select_related('profile').filter(pk=user_id).afirst()
+        if user is None:
+            return await auth.aget_user(request)
+        await cache.aset(key, user, settings.SESSION_USER_CACHE_TIMEOUT)
+
+    session_hash = await request.session.aget(HASH_SESSION_KEY)
+    if not (user.is_active and session_hash and
+            constant_time_compare(session_hash, user.get_session_auth_hash())):
+        return await auth.aget_user(request)
+
+    user.backend = backend_path
+    return user
+
+
+class CachedUserMiddleware:
+    """Goes directly after AuthenticationMiddleware"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        self.install(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        self.install(request)
+        return await self.get_response(request)
+
+    def install(self, request):
+        # Whichever of user/auser() resolves first is reused by the other
+        request.user = SimpleLazyObject(partial(self._user, request))
+        request.auser = partial(self._auser, request)
+
+    @staticmethod
+    def _user(request):
+        if not hasattr(request, '_session_user'):
+            request._session_user = get_cached_user(request)
+        return request._session_user
+
+    @staticmethod
+    async def _auser(request):
+        if not hasattr(request, '_session_user'):
+            request._session_user = await aget_cached_user(request)
+        return request._session_user
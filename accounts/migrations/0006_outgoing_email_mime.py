@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_profile_avatar_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outgoingemail',
+            name='mime',
+            field=models.BinaryField(default=b''),
+        ),
+    ]
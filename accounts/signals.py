@@ -1,7 +1,9 @@
 # accounts/signals.py
-from django.db.models.signals import post_save
+from django.db.models.signals import m2m_changed, post_delete, post_save
 from django.contrib.auth.models import User
 from django.dispatch import receiver
+from core import cache
+from .middleware import forget_user
 from .models import Profile  
 
 @receiver(post_save, sender=User)
@@ -10,10 +12,33 @@ def create_user_profile(sender, instance, created, **kwargs):
     if created:
         Profile.objects.create(user=instance)
 
+@receiver(post_save, sender=Profile)
+def profile_changed(sender, instance, **kwargs):
+    """Avatars appear on cached article cards and comments"""
+    cache.bump(cache.PROFILES)
+
 @receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
-    """Saves the profile when the User is updated"""
-    try:
-        instance.profile.save()
-    except Profile.DoesNotExist:
-        Profile.objects.create(user=instance)
\ No newline at end of file
+@receiver(post_delete, sender=User)
+def forget_cached_user(sender, instance, **kwargs):
+    """Drop the user cached for their sessions by accounts.middleware"""
+    forget_user(instance.pk)
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def forget_cached_profile_user(sender, instance, **kwargs):
+    forget_user(instance.user_id)
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+def forget_users_with_changed_access(sender, instance, action, reverse, pk_set, **kwargs):
+    """Group and permission changes reach the cached user too"""
+    if not reverse:
+        if action.startswith('post_'):
+            forget_user(instance.pk)
+    elif action == 'pre_clear':
+        # post_clear has no pk_set, so collect the members while they still exist
+        for user_id in instance.user_set.values_list('pk', flat=True):
+            forget_user(user_id)
+    elif action in ('post_add', 'post_remove'):
+        for user_id in pk_set:
+            forget_user(user_id)
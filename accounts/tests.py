@@ -1,3 +1,244 @@
-from django.test import TestCase
+import time
+from datetime import timedelta
+from email import message_from_bytes
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import Group, Permission, User
+from django.core import mail
+from django.core.mail import EmailMultiAlternatives
+from django.core.cache import cache
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .mail import deliver_pending
+from .middleware import user_cache_key
+from .models import OutgoingEmail, Profile
+
+
+class FailingBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        raise ConnectionError("SMTP unavailable")
+
+
+class UnreachableBackend(BaseEmailBackend):
+    def open(self):
+        raise ConnectionRefusedError("Connection refused")
+
+    def send_messages(self, email_messages):
+        raise AssertionError("send_messages called without a connection")
+
+
+@override_settings(
+    EMAIL_BACKEND='accounts.mail.OutboxBackend',
+    OUTBOX_DELIVERY_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+)
+class OutboxTests(TestCase):
+    def register(self):
+        return self.client.post(reverse('register_page'), {
+            'name': 'New Writer',
+            'email': 'writer@example.com',
+            'username': 'newwriter',
+            'password': 'a-long-password',
+            'confirm_password': 'a-long-password',
+        })
+
+    def test_registration_only_queues_the_email(self):
+        response = self.register()
+        self.assertRedirects(response, reverse('verification_sent'))
+        self.assertEqual(len(mail.outbox), 0)
+
+        queued = OutgoingEmail.objects.get()
+        self.assertEqual(queued.to, ['writer@example.com'])
+        self.assertIn('/accounts/activate/', queued.html_body)
+
+    def test_worker_delivers_queued_email(self):
+        self.register()
+        call_command('run_mail_worker', '--once', stdout=StringIO())
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].subject, 'Activate your account')
+        self.assertEqual(mail.outbox[0].alternatives[0].mimetype, 'text/html')
+        self.assertEqual(OutgoingEmail.objects.get().status, OutgoingEmail.SENT)
+
+    def test_attachments_and_alternatives_are_delivered(self):
+        message = EmailMultiAlternatives(
+            'Your invite', 'Plain café', 'site@example.com', ['reader@example.com'],
+            bcc=['audit@example.com'],
+        )
+        message.attach_alternative('<p>HTML café</p>', 'text/html')
+        message.attach_alternative('BEGIN:VCALENDAR', 'text/calendar')
+        message.attach('invite.pdf', b'%PDF-1.4 bytes', 'application/pdf')
+        message.send()
+        self.assertEqual(len(mail.outbox), 0)
+
+        self.assertEqual(deliver_pending(), (1, 0))
+        delivered = mail.outbox[0]
+        self.assertEqual(delivered.recipients(), ['reader@example.com', 'audit@example.com'])
+        raw = delivered.message().as_bytes(linesep='\r\n')
+        self.assertNotIn(b'audit@example.com', raw)
+        parts = {part.get_content_type(): part for part in message_from_bytes(raw).walk()}
+        self.assertEqual(parts['text/plain'].get_payload(decode=True).decode(), 'Plain café')
+        self.assertIn('text/calendar', parts)
+        self.assertEqual(parts['application/pdf'].get_filename(), 'invite.pdf')
+        self.assertEqual(parts['application/pdf'].get_payload(decode=True), b'%PDF-1.4 bytes')
+
+    def test_password_reset_is_queued(self):
+        User.objects.create_user('reader', email='reader@example.com', password='pass12345')
+        self.client.post(reverse('password_reset'), {'email': 'reader@example.com'})
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(OutgoingEmail.objects.get().to, ['reader@example.com'])
+
+    @override_settings(
+        OUTBOX_DELIVERY_BACKEND='accounts.tests.FailingBackend',
+        OUTBOX_MAX_ATTEMPTS=2,
+        OUTBOX_RETRY_BACKOFF=60,
+    )
+    def test_failed_delivery_backs_off_then_gives_up(self):
+        self.register()
+        self.assertEqual(deliver_pending(), (0, 1))
+
+        queued = OutgoingEmail.objects.get()
+        self.assertEqual(queued.status, OutgoingEmail.PENDING)
+        self.assertGreater(queued.next_attempt_at, timezone.now() + timedelta(seconds=50))
+        self.assertEqual(deliver_pending(), (0, 0))
+
+        OutgoingEmail.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(deliver_pending(), (0, 1))
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, OutgoingEmail.FAILED)
+        self.assertEqual(queued.last_error, 'SMTP unavailable')
+
+    @override_settings(
+        OUTBOX_DELIVERY_BACKEND='accounts.tests.UnreachableBackend',
+        OUTBOX_MAX_ATTEMPTS=2,
+    )
+    def test_unreachable_server_fails_the_batch_without_crashing(self):
+        self.register()
+        call_command('run_mail_worker', '--once', stdout=StringIO())
+
+        queued = OutgoingEmail.objects.get()
+        self.assertEqual(queued.status, OutgoingEmail.PENDING)
+        self.assertEqual(queued.attempts, 1)
+        self.assertEqual(queued.last_error, 'Connection refused')
+        self.assertGreater(queued.next_attempt_at, timezone.now() + timedelta(seconds=30))
+
+        OutgoingEmail.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(deliver_pending(), (0, 1))
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, OutgoingEmail.FAILED)
+
+
+class CachedUserTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('reader', password='pass12345')
+        self.client.force_login(self.user)
+
+    def get_page(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('search'))
+        self.assertEqual(response.context['user'], self.user)
+        return len(queries)
+
+    def test_repeat_requests_hit_no_tables(self):
+        self.assertGreater(self.get_page(), 0)
+        self.assertEqual(self.get_page(), 0)
+
+    def test_user_is_loaded_with_profile(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('search'))
+        user_queries = [q['sql'] for q in queries if 'FROM "auth_user"' in q['sql']]
+        self.assertEqual(len(user_queries), 1)
+        self.assertIn('"accounts_profile"', user_queries[0])
+
+    def test_profile_save_refreshes_cached_user(self):
+        self.get_page()
+        self.client.post(reverse('toggle_dark_mode'))
+        self.assertNotIn(user_cache_key(self.user.pk), cache)
+        response = self.client.get(reverse('search'))
+        self.assertTrue(response.context['user'].profile.dark_mode)
+
+    def test_password_change_ends_cached_session(self):
+        self.get_page()
+        self.user.set_password('another-pass-123')
+        self.user.save()
+        response = self.client.get(reverse('search'))
+        self.assertFalse(response.context['user'].is_authenticated)
+
+    def test_deactivated_user_is_logged_out(self):
+        self.get_page()
+        self.user.is_active = False
+        self.user.save(update_fields=['is_active'])
+        response = self.client.get(reverse('search'))
+        self.assertFalse(response.context['user'].is_authenticated)
+
+    def test_unsignalled_updates_are_seen_after_the_timeout(self):
+        self.get_page()
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertTrue(self.client.get(reverse('search')).context['user'].is_authenticated)
+        later = time.time() + settings.SESSION_USER_CACHE_TIMEOUT + 1
+        with mock.patch('time.time', return_value=later):
+            response = self.client.get(reverse('search'))
+        self.assertFalse(response.context['user'].is_authenticated)
+
+    def test_group_and_permission_changes_refresh_cached_user(self):
+        key = user_cache_key(self.user.pk)
+        group = Group.objects.create(name='editors')
+        permission = Permission.objects.get(codename='change_article')
+        changes = [
+            lambda: self.user.groups.add(group),
+            lambda: group.user_set.clear(),
+            lambda: permission.user_set.add(self.user),
+            lambda: self.user.user_permissions.remove(permission),
+        ]
+        for change in changes:
+            self.get_page()
+            self.assertIn(key, cache)
+            change()
+            self.assertNotIn(key, cache)
+
+
+class ProfileWriteTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('reader', password='pass12345')
+
+    def capture(self, *args, **kwargs):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(*args, **kwargs)
+        self.assertEqual(response.status_code, 302)
+        return [query['sql'] for query in queries]
+
+    def writes(self, queries, table):
+        return [sql for sql in queries if sql.startswith(('UPDATE', 'INSERT')) and f'"{table}"' in sql]
+
+    def test_login_does_not_touch_the_profile(self):
+        queries = self.capture(reverse('login_page'), {'username': 'reader', 'password': 'pass12345'})
+        self.assertFalse([sql for sql in queries if '"accounts_profile"' in sql])
+        self.assertEqual(len(self.writes(queries, 'auth_user')), 1)
+
+    def test_profile_update_writes_only_changed_rows(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse('search'))
+
+        with self.assertNumQueries(3):
+            queries = self.capture(reverse('profile_update'), {'username': 'reader', 'first_name': 'Rea', 'bio': ''})
+        self.assertEqual(len(self.writes(queries, 'auth_user')), 1)
+        self.assertFalse(self.writes(queries, 'accounts_profile'))
+
+        queries = self.capture(reverse('profile_update'), {'username': 'reader', 'first_name': 'Rea', 'bio': 'Hello'})
+        self.assertFalse(self.writes(queries, 'auth_user'))
+        self.assertEqual(len(self.writes(queries, 'accounts_profile')), 1)
+        self.assertEqual(User.objects.get().profile.bio, 'Hello')
+
+    def test_profile_is_created_once(self):
+        self.assertEqual(Profile.objects.filter(user=self.user).count(), 1)
+        self.user.save()
+        self.assertEqual(Profile.objects.filter(user=self.user).count(), 1)
@@ -125,7 +125,7 @@ def activate_account(request, uidb64, token):
 
     if user is not None and default_token_generator.check_token(user, token):
         user.is_active = True
-        user.save()
+        user.save(update_fields=['is_active'])
         messages.success(request, 'Your account has been activated! You can now log in.')
         return redirect('login_page')
     else:
@@ -185,9 +185,9 @@ def reset_password_view(request):
 def profile(request):
     profile = get_object_or_404(Profile, user=request.user)
     
-    user_articles = Article.objects.filter(author=request.user).order_by('-published_at')
+    user_articles = Article.objects.feed().filter(author=request.user).order_by('-published_at')
     
-    article_stats = user_articles.aggregate(
+    article_stats = Article.objects.filter(author=request.user).aggregate(
         total=Count('id'),
         published=Count('id', filter=Q(status='published')),
         draft=Count('id', filter=Q(status='draft'))
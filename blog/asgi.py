@@ -12,5 +12,8 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'blog.settings')
+# The default deployment is WSGI (blog.wsgi). Under an ASGI server, e.g.
+# uvicorn blog.asgi:application --workers 4, set ASYNC_VIEWS=true to route
+# the read-only pages to core.async_views.
 
 application = get_asgi_application()
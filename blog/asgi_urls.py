@@ -0,0 +1,17 @@
+"""
+URL configuration for the ASGI entry point (blog.asgi).
+
+The read-only pages resolve to their async versions in core.async_views;
+everything else falls through to blog.urls unchanged.
+"""
+from django.urls import path
+from core import async_views
+from .urls import urlpatterns as sync_urlpatterns
+
+urlpatterns = [
+    path('', async_views.home, name='home'),
+    path('article/<slug:slug>/', async_views.article_detail, name='article_detail'),
+    path('category/', async_views.category, name='category'),
+    path('category/<slug:slug>/', async_views.category_articles, name='category_articles'),
+    path('about/', async_views.about_page, name='about'),
+] + sync_urlpatterns
@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+import sys
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -71,22 +72,32 @@ SOCIALACCOUNT_PROVIDERS = {
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'core.middleware.StaticFilesMiddleware',
+    'core.middleware.SharedCacheMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'accounts.middleware.CachedUserMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
 NEW_MIDDLEWARE = [
+    'core.middleware.RequestMetricsMiddleware',
+    'core.middleware.PrimaryPinMiddleware',
     'allauth.account.middleware.AccountMiddleware',
 ]
 
 MIDDLEWARE = NEW_MIDDLEWARE + MIDDLEWARE
 
-ROOT_URLCONF = 'blog.urls'
+# Serve the read-only pages from the async views in core.async_views. Off by
+# default: measured with manage.py bench_serving they are slower than the
+# sync views under WSGI on these pages, so only turn it on under an ASGI
+# server and after benchmarking against your database.
+ASYNC_VIEWS = os.environ.get("ASYNC_VIEWS", "").lower() in ("1", "true", "yes")
+
+ROOT_URLCONF = 'blog.asgi_urls' if ASYNC_VIEWS else 'blog.urls'
 
 TEMPLATES = [
     {
@@ -98,6 +109,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'core.context_processors.fragment_cache',
             ],
         },
     },
@@ -111,15 +123,122 @@ WSGI_APPLICATION = 'blog.wsgi.application'
 
 import dj_database_url
 
+# PostgreSQL connections can come from a psycopg 3 pool per process
+# (Django's OPTIONS["pool"]) instead of one persistent connection per worker
+# thread. Pooled connections are health-checked on checkout and replaced
+# after DATABASE_POOL_MAX_LIFETIME; core.views.db_pool_stats reports usage.
+# With pooling off, connections persist for CONN_MAX_AGE as before.
+DATABASE_POOL_ENABLED = os.environ.get("DATABASE_POOL_ENABLED", "").lower() in ("1", "true", "yes")
+DATABASE_POOL_MIN_SIZE = int(os.environ.get("DATABASE_POOL_MIN_SIZE", 2))
+DATABASE_POOL_MAX_SIZE = int(os.environ.get("DATABASE_POOL_MAX_SIZE", 10))
+DATABASE_POOL_MAX_LIFETIME = int(os.environ.get("DATABASE_POOL_MAX_LIFETIME", 30 * 60))
+DATABASE_POOL_MAX_IDLE = int(os.environ.get("DATABASE_POOL_MAX_IDLE", 10 * 60))
+DATABASE_POOL_TIMEOUT = int(os.environ.get("DATABASE_POOL_TIMEOUT", 10))
+DATABASE_POOL_HEALTH_CHECKS = os.environ.get("DATABASE_POOL_HEALTH_CHECKS", "true").lower() in ("1", "true", "yes")
+DATABASE_POOL_METRICS_TOKEN = os.environ.get("DATABASE_POOL_METRICS_TOKEN")
+
+
+def database_config(config, alias):
+    if not (DATABASE_POOL_ENABLED and config.get('ENGINE') == 'django.db.backends.postgresql'):
+        return config
+    # Pooled connections go back to the pool after each request
+    config['CONN_MAX_AGE'] = 0
+    config['CONN_HEALTH_CHECKS'] = DATABASE_POOL_HEALTH_CHECKS
+    config.setdefault('OPTIONS', {})['pool'] = {
+        'name': alias,
+        'min_size': DATABASE_POOL_MIN_SIZE,
+        'max_size': DATABASE_POOL_MAX_SIZE,
+        'max_lifetime': DATABASE_POOL_MAX_LIFETIME,
+        'max_idle': DATABASE_POOL_MAX_IDLE,
+        'timeout': DATABASE_POOL_TIMEOUT,
+    }
+    return config
+
+
 DATABASE_URL= os.environ.get("DATABASE_URL")
 DATABASES = {
-    'default': dj_database_url.config(
+    'default': database_config(dj_database_url.config(
         default=DATABASE_URL,
         conn_max_age=600,
-        ssl_require=True
-    )
+        ssl_require=not (DATABASE_URL or '').startswith('sqlite')
+    ), 'default')
 }
 
+# Optional read replicas, comma-separated URLs. Reads of core and accounts
+# models are spread over them; writes and a writer's reads right after go
+# to the primary (core.routers).
+DATABASE_REPLICA_URLS = [url.strip() for url in os.environ.get("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+DATABASE_REPLICAS = []
+for number, url in enumerate(DATABASE_REPLICA_URLS, 1):
+    alias = f'replica{number}'
+    DATABASES[alias] = database_config(dj_database_url.parse(
+        url,
+        conn_max_age=600,
+        conn_health_checks=True,
+        ssl_require=not url.startswith('sqlite'),
+    ), alias)
+    # Tests see the primary's test database through every replica
+    DATABASES[alias]['TEST'] = {'MIRROR': 'default'}
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter'] if DATABASE_REPLICAS else []
+DATABASE_PRIMARY_PIN_SECONDS = int(os.environ.get("DATABASE_PRIMARY_PIN_SECONDS", 15))
+DATABASE_REPLICA_RETRY_SECONDS = int(os.environ.get("DATABASE_REPLICA_RETRY_SECONDS", 30))
+DATABASE_REPLICA_CHECK_SECONDS = int(os.environ.get("DATABASE_REPLICA_CHECK_SECONDS", 10))
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+REDIS_URL = os.environ.get("REDIS_URL")
+MEMCACHED_LOCATION = os.environ.get("MEMCACHED_LOCATION")
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+elif MEMCACHED_LOCATION:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+            'LOCATION': MEMCACHED_LOCATION,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'bloggers-haven',
+        }
+    }
+
+# Whole anonymous pages and template fragments (see core.cache)
+CACHE_PAGE_TIMEOUT = int(os.environ.get("CACHE_PAGE_TIMEOUT", 300))
+CACHE_FRAGMENT_TIMEOUT = int(os.environ.get("CACHE_FRAGMENT_TIMEOUT", 600))
+
+# Shared caching of anonymous pages by a CDN or reverse proxy (core.cdn).
+# Off when CDN_CACHE_SECONDS is 0. The proxy must pass requests carrying the
+# session or messages cookie through uncached, and can purge by the
+# namespace tags in CDN_TAG_HEADER: changes queue their tags, and
+# manage.py run_cdn_purger passes what is queued to CDN_PURGE_BACKEND every
+# CDN_PURGE_INTERVAL seconds (by default a POST to CDN_PURGE_URL).
+CDN_CACHE_SECONDS = int(os.environ.get("CDN_CACHE_SECONDS", 0))
+CDN_TAG_HEADER = os.environ.get("CDN_TAG_HEADER", "Surrogate-Key")
+CDN_PURGE_URL = os.environ.get("CDN_PURGE_URL")
+CDN_PURGE_TOKEN = os.environ.get("CDN_PURGE_TOKEN")
+CDN_PURGE_BACKEND = os.environ.get("CDN_PURGE_BACKEND", "core.cdn.http_purge" if CDN_PURGE_URL else "")
+CDN_PURGE_TIMEOUT = int(os.environ.get("CDN_PURGE_TIMEOUT", 5))
+CDN_PURGE_INTERVAL = float(os.environ.get("CDN_PURGE_INTERVAL", 2))
+
+# Sessions are read from the cache and written through to the database.
+# The logged-in user and profile are cached alongside (accounts.middleware),
+# for minutes only so updates that skip the signals are picked up soon.
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+SESSION_USER_CACHE_TIMEOUT = int(os.environ.get("SESSION_USER_CACHE_TIMEOUT", 60 * 5))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -160,13 +279,49 @@ STATICFILES_DIRS = [BASE_DIR / 'static']
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
 MEDIA_URL = '/media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+
+# Article feeds (home, category pages)
+ARTICLE_FEED_PAGE_SIZE = int(os.environ.get("ARTICLE_FEED_PAGE_SIZE", 12))
+ARTICLE_FEED_MAX_PAGE_SIZE = 50
+ARTICLE_FEED_COUNT_CAP = 100
+
+SEARCH_RESULTS_PER_PAGE = 10
+
+# Trending ranking, rebuilt by manage.py compute_trending (see core.trending)
+TRENDING_WINDOW_HOURS = int(os.environ.get("TRENDING_WINDOW_HOURS", 7 * 24))
+TRENDING_HALF_LIFE_HOURS = int(os.environ.get("TRENDING_HALF_LIFE_HOURS", 24))
+TRENDING_LIKE_WEIGHT = 1.0
+TRENDING_COMMENT_WEIGHT = 2.0
+TRENDING_SIZE = 50
+TRENDING_HOME_SIZE = 5
+
+# Article comments
+COMMENT_THREAD_MAX_DEPTH = 4
+COMMENT_THREADS_PER_PAGE = 20
+
+# manage.py test never talks to Cloudinary; the image tests use a temp dir
+USE_LOCAL_MEDIA = (
+    os.environ.get("USE_LOCAL_MEDIA", "").lower() in ("1", "true", "yes")
+    or sys.argv[1:2] == ["test"]
+)
 
 STORAGES = {
     "staticfiles": {
         "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage",
     },
+    # Uploads go to Cloudinary; USE_LOCAL_MEDIA opts into files under
+    # MEDIA_ROOT for local development. Either way url() results are
+    # memoized (core.storage).
     "default": {
-        "BACKEND": "cloudinary_storage.storage.MediaCloudinaryStorage",
+        "BACKEND": "core.storage.cached_url_storage",
+        "OPTIONS": {
+            "backend": (
+                "django.core.files.storage.FileSystemStorage"
+                if USE_LOCAL_MEDIA
+                else "cloudinary_storage.storage.MediaCloudinaryStorage"
+            ),
+        },
     },
 }
 
@@ -201,7 +356,17 @@ ACCOUNT_LOGIN_METHODS = ['username', 'email']
 
 
 
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+# Requests only queue mail (accounts.mail.OutboxBackend); manage.py
+# run_mail_worker delivers it through OUTBOX_DELIVERY_BACKEND.
+EMAIL_BACKEND = 'accounts.mail.OutboxBackend'
+OUTBOX_DELIVERY_BACKEND = os.environ.get(
+    "OUTBOX_DELIVERY_BACKEND", 'django.core.mail.backends.smtp.EmailBackend'
+)
+OUTBOX_BATCH_SIZE = 50
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_RETRY_BACKOFF = 60
+OUTBOX_LEASE_SECONDS = 300
+OUTBOX_POLL_INTERVAL = 5
 EMAIL_HOST = 'smtp.gmail.com'
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True
@@ -220,8 +385,6 @@ VERIFICATION_FAILED_URL = '/invalid/'
 
 
 
-import sys
-
 LOGGING = {
     "version": 1,
     "disable_existing_loggers": False,
@@ -236,4 +399,43 @@ LOGGING = {
         "handlers": ["console"],
         "level": "ERROR",
     },
-}
\ No newline at end of file
+    "loggers": {
+        # One JSON line per request from core.middleware.RequestMetricsMiddleware
+        "core.requests": {
+            "handlers": ["console"],
+            "level": "INFO",
+            "propagate": False,
+        },
+        # Replicas dropped from rotation by core.routers
+        "core.routers": {
+            "handlers": ["console"],
+            "level": "WARNING",
+            "propagate": False,
+        },
+        # Outbox batches run_mail_worker could not process
+        "accounts.mail": {
+            "handlers": ["console"],
+            "level": "WARNING",
+            "propagate": False,
+        },
+        # Uploads core.images could not resize, variants it could not delete
+        "core.images": {
+            "handlers": ["console"],
+            "level": "WARNING",
+            "propagate": False,
+        },
+        # Failed CDN purges (run_cdn_purger)
+        "core.cdn": {
+            "handlers": ["console"],
+            "level": "WARNING",
+            "propagate": False,
+        },
+    },
+}
+
+# Per-request instrumentation (core.middleware). Off by default; when off
+# the middleware is dropped at startup and costs nothing.
+REQUEST_METRICS_ENABLED = os.environ.get("REQUEST_METRICS_ENABLED", "").lower() in ("1", "true", "yes")
+REQUEST_METRICS_SERVER_TIMING = os.environ.get("REQUEST_METRICS_SERVER_TIMING", "true").lower() in ("1", "true", "yes")
+REQUEST_QUERY_BUDGET = int(os.environ.get("REQUEST_QUERY_BUDGET", 20))
+REQUEST_TIME_BUDGET_MS = int(os.environ.get("REQUEST_TIME_BUDGET_MS", 500))
\ No newline at end of file
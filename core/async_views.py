@@ -0,0 +1,128 @@
+"""
+Async versions of the read-only pages, routed by blog.asgi_urls.
+
+Under an ASGI server these run on the event loop and only hop to a thread
+for the ORM queries and rendering, so a slow database or Cloudinary call
+holds up one request instead of a whole worker. They share the caches,
+validators and templates of core.views and render the same pages.
+
+They are opt-in (ASYNC_VIEWS): each ORM call, cache lookup and render is a
+thread hop, and on pages this cheap to build the hops and the ASGI handler
+cost more than they save. Compare with manage.py bench_serving first.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.shortcuts import aget_object_or_404, render
+from . import cache, conditional, views
+from .cache import cache_anonymous_page
+from .models import Article, Category, Like
+from .pagination import CursorPaginator, acapped_count, get_per_page
+from .trending import atrending_articles
+
+# Templates may still touch lazy relations and context processors, so
+# rendering runs in the request's thread like any other ORM call
+arender = sync_to_async(render)
+
+
+async def category_stats():
+    """``views.category_stats()``, sharing its cache entry"""
+    async def compute():
+        return [category async for category in Category.objects.with_stats().order_by('name')]
+    return await cache.acached_value('category-stats', (cache.ARTICLES, cache.CATEGORIES), compute)
+
+
+async def _feed_page(request, articles):
+    page = await CursorPaginator(articles, per_page=get_per_page(request)).apage(
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
+    articles_count, articles_count_capped = await acapped_count(articles)
+    return {
+        'articles': page.object_list,
+        'page': page,
+        'articles_count': articles_count,
+        'articles_count_capped': articles_count_capped,
+    }
+
+
+@conditional.list_page(cache.ARTICLES, cache.CATEGORIES, cache.LIKES, cache.PROFILES, cache.TRENDING)
+@cache_anonymous_page(cache.ARTICLES, cache.CATEGORIES, cache.LIKES, cache.PROFILES, cache.TRENDING)
+async def home(request):
+    category_slug = request.GET.get('category')
+    articles = Article.objects.published().feed()
+
+    if category_slug:
+        category = await aget_object_or_404(Category, slug=category_slug)
+        articles = articles.filter(categories=category)
+
+    context = await _feed_page(request, articles)
+    first_page = not (category_slug or context['page'].has_previous)
+    context.update({
+        'trending': await atrending_articles(settings.TRENDING_HOME_SIZE) if first_page else [],
+        # Uncalled, as in views.home: the template calls it (in the render
+        # thread) only when the category pills fragment is re-rendered
+        'categories': views.category_stats,
+        'selected_category': category_slug,
+    })
+    return await arender(request, 'blog/article_list.html', context)
+
+
+@conditional.article_page(cache.ARTICLES, cache.COMMENTS, cache.LIKES, cache.PROFILES)
+@cache_anonymous_page(cache.ARTICLES, cache.COMMENTS, cache.LIKES, cache.PROFILES)
+async def article_detail(request, slug):
+    article = await aget_object_or_404(
+        Article.objects.published().select_related('author__profile').defer('content'),
+        slug=slug,
+    )
+    threads = await article.comments.atree(max_depth=settings.COMMENT_THREAD_MAX_DEPTH)
+    comments = Paginator(threads, settings.COMMENT_THREADS_PER_PAGE).get_page(
+        request.GET.get('comments_page')
+    )
+    user = await request.auser()
+    liked = await Like.objects.filter(article=article, user=user).aexists() if user.is_authenticated else False
+
+    context = {
+        'article': article,
+        'comments': comments,
+        'liked': liked,
+        'total_likes': article.like_count,
+    }
+    return await arender(request, 'blog/article_detail.html', context)
+
+
+@cache_anonymous_page(cache.ARTICLES, cache.CATEGORIES)
+async def category(request):
+    """Display all categories with search functionality"""
+    search_query = request.GET.get('search', '').strip()
+    stats = await category_stats()
+
+    categories = stats
+    if search_query:
+        needle = search_query.casefold()
+        categories = [c for c in stats if needle in c.name.casefold()]
+
+    popular_categories = sorted(
+        (c for c in stats if c.article_count), key=lambda c: -c.article_count,
+    )[:views.POPULAR_CATEGORIES]
+
+    return await arender(request, 'blog/category_list.html', {
+        'categories': categories,
+        'popular_categories': popular_categories,
+        'search_query': search_query,
+    })
+
+
+@conditional.list_page(cache.ARTICLES, cache.CATEGORIES, cache.LIKES, cache.PROFILES)
+@cache_anonymous_page(cache.ARTICLES, cache.CATEGORIES, cache.LIKES, cache.PROFILES)
+async def category_articles(request, slug):
+    """Display articles for a specific category"""
+    category = await aget_object_or_404(Category, slug=slug)
+
+    context = await _feed_page(request, Article.objects.published().feed().filter(categories=category))
+    context['category'] = category
+    return await arender(request, 'blog/category_article.html', context)
+
+
+async def about_page(request):
+    return await arender(request, 'blog/about.html')
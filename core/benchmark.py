@@ -0,0 +1,404 @@
+"""
+Latency and query-count benchmarks for the public views.
+
+``seed()`` fills the database with synthetic users, categories, articles,
+comments and likes; ``run()`` drives each view through the test client and
+returns a JSON-serialisable report; ``compare()`` checks a report against a
+baseline. manage.py bench_views wires them together inside a throwaway
+test database.
+
+``serve_wsgi()`` and ``serve_asgi()`` push the same URLs through the real
+WSGI and ASGI handlers with many requests in flight, for manage.py
+bench_serving.
+"""
+import asyncio
+import platform
+import random
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
+from io import BytesIO, StringIO
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.cache import cache as default_cache
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client
+from django.test.utils import (
+    CaptureQueriesContext, override_settings, setup_test_environment, teardown_test_environment,
+)
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.text import slugify
+from accounts.models import Profile
+from . import cache
+from .models import Article, Category, Comment, Like
+from .search import index_articles
+
+DEFAULT_SCALE = {
+    'users': 50,
+    'categories': 12,
+    'articles': 1000,
+    'comments': 5000,
+    'likes': 10000,
+}
+BATCH_SIZE = 500
+PASSWORD = 'bench-pass-123'
+PERCENTILES = (50, 90, 95, 99)
+
+WORDS = (
+    'bread flour water salt starter proof oven crust crumb rye spelt hydration '
+    'travel train coast harbour market morning evening river mountain trail '
+    'python django query index cache latency page template request database'
+).split()
+
+
+# The pages core.async_views serves, as named in _targets()
+ASYNC_VIEWS = ('home', 'article_detail', 'category', 'category_articles')
+
+
+@contextmanager
+def throwaway_database(caches):
+    """A freshly created test database and the given CACHES, for seeding and benchmarking"""
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        with override_settings(CACHES=caches):
+            yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def _sentence(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+
+def _paragraphs(rng, count):
+    return '\n\n'.join(
+        ' '.join(_sentence(rng, rng.randint(6, 16)) for _ in range(rng.randint(3, 6)))
+        for _ in range(count)
+    )
+
+
+def seed(users, categories, articles, comments, likes, random_seed=0):
+    """
+    Bulk-insert synthetic content. Derived data the signals would normally
+    maintain (profiles, rendered bodies, counters, search index) is filled
+    in directly.
+    """
+    rng = random.Random(random_seed)
+    now = timezone.now()
+    password = make_password(PASSWORD)
+
+    User.objects.bulk_create(
+        [User(username=f'bench-user-{i}', password=password) for i in range(users)],
+        batch_size=BATCH_SIZE,
+    )
+    user_ids = list(User.objects.filter(username__startswith='bench-user-').values_list('id', flat=True))
+    Profile.objects.bulk_create([Profile(user_id=user_id) for user_id in user_ids], batch_size=BATCH_SIZE)
+
+    Category.objects.bulk_create([
+        Category(name=f'Bench category {i}', slug=f'bench-category-{i}') for i in range(categories)
+    ])
+    category_ids = list(Category.objects.filter(slug__startswith='bench-category-').values_list('id', flat=True))
+
+    new_articles = []
+    for i in range(articles):
+        title = _sentence(rng, rng.randint(3, 8)).rstrip('.')
+        published = rng.random() < 0.9
+        article = Article(
+            title=title,
+            slug=f'{slugify(title)[:200]}-{i}',
+            author_id=rng.choice(user_ids),
+            content=_paragraphs(rng, rng.randint(2, 8)),
+            status=Article.PUBLISHED if published else Article.DRAFT,
+            published_at=now - timedelta(seconds=rng.randint(0, 365 * 24 * 3600)) if published else None,
+        )
+        article.render()
+        new_articles.append(article)
+    Article.objects.bulk_create(new_articles, batch_size=BATCH_SIZE)
+    article_ids = [article.pk for article in new_articles]
+
+    Through = Article.categories.through
+    Through.objects.bulk_create([
+        Through(article_id=article_id, category_id=category_id)
+        for article_id in article_ids
+        for category_id in rng.sample(category_ids, min(len(category_ids), rng.randint(1, 3)))
+    ], batch_size=BATCH_SIZE)
+
+    # A quarter of the comments reply to an earlier top-level comment
+    top_level = [
+        Comment(article_id=rng.choice(article_ids), user_id=rng.choice(user_ids), body=_sentence(rng, 12))
+        for _ in range(comments - comments // 4)
+    ]
+    Comment.objects.bulk_create(top_level, batch_size=BATCH_SIZE)
+    if top_level:
+        replies = []
+        for _ in range(comments // 4):
+            parent = rng.choice(top_level)
+            replies.append(Comment(
+                article_id=parent.article_id, parent_id=parent.pk,
+                user_id=rng.choice(user_ids), body=_sentence(rng, 8),
+            ))
+        Comment.objects.bulk_create(replies, batch_size=BATCH_SIZE)
+
+    pairs = set()
+    likes = min(likes, len(user_ids) * len(article_ids))
+    while len(pairs) < likes:
+        pairs.add((rng.choice(user_ids), rng.choice(article_ids)))
+    Like.objects.bulk_create(
+        [Like(user_id=user_id, article_id=article_id) for user_id, article_id in pairs],
+        batch_size=BATCH_SIZE,
+    )
+
+    call_command('recount_article_stats', stdout=StringIO())
+    for start in range(0, len(article_ids), BATCH_SIZE):
+        index_articles(article_ids[start:start + BATCH_SIZE])
+    cache.bump(*cache.NAMESPACES)
+
+
+def _targets(rng):
+    """The URLs each benchmarked view is exercised with"""
+    published = Article.objects.published()
+    popular = list(published.order_by('-comment_count', '-like_count').values_list('slug', flat=True)[:20])
+    ids = list(published.values_list('pk', flat=True))
+    sample = rng.sample(ids, min(len(ids), 20))
+    typical = list(published.filter(pk__in=sample).order_by('pk').values_list('slug', flat=True))
+    categories = list(Category.objects.values_list('slug', flat=True))
+    terms = rng.sample(WORDS, 10)
+    return {
+        'home': [reverse('home')],
+        'article_detail': [reverse('article_detail', args=[slug]) for slug in popular + typical],
+        'category': [reverse('category')],
+        'category_articles': [reverse('category_articles', args=[slug]) for slug in categories],
+        'search': [f"{reverse('search')}?q={term}" for term in terms],
+    }
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = (len(ordered) - 1) * pct / 100
+    low = int(index)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (index - low)
+
+
+def _summarise(latencies, queries):
+    summary = {f'p{pct}_ms': round(percentile(latencies, pct), 3) for pct in PERCENTILES}
+    summary.update({
+        'mean_ms': round(statistics.fmean(latencies), 3),
+        'max_ms': round(max(latencies), 3),
+        'requests': len(latencies),
+        'queries_mean': round(statistics.fmean(queries), 2),
+        'queries_max': max(queries),
+    })
+    return summary
+
+
+def run(requests=50, warm=False, authenticated=False, random_seed=0):
+    """
+    Request every benchmarked view ``requests`` times, cycling through its
+    URLs. Unless ``warm``, the cache is cleared before each request so the
+    numbers reflect the view itself rather than the page cache.
+    """
+    rng = random.Random(random_seed)
+    client = Client()
+    if authenticated:
+        username = User.objects.filter(username__startswith='bench-user-').values_list('username', flat=True)[0]
+        client.login(username=username, password=PASSWORD)
+
+    views = {}
+    for name, urls in _targets(rng).items():
+        if not urls:
+            continue
+        client.get(urls[0])  # imports, template loading
+        latencies, queries = [], []
+        for i in range(requests):
+            if not warm:
+                # Sessions survive this; cached_db falls back to the table
+                default_cache.clear()
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                response = client.get(urls[i % len(urls)])
+                latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code != 200:
+                raise RuntimeError(f"{urls[i % len(urls)]} returned {response.status_code}")
+            queries.append(len(captured))
+        views[name] = _summarise(latencies, queries)
+    return views
+
+
+def serving_urls(random_seed=0):
+    """The URLs of the pages both serving paths have, in a shuffled order"""
+    rng = random.Random(random_seed)
+    targets = _targets(rng)
+    urls = [url for name in ASYNC_VIEWS for url in targets[name]]
+    rng.shuffle(urls)
+    return urls
+
+
+def _throughput(latencies, elapsed, errors):
+    summary = {f'p{pct}_ms': round(percentile(latencies, pct), 3) for pct in PERCENTILES}
+    summary.update({
+        'requests': len(latencies),
+        'errors': errors,
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(len(latencies) / elapsed, 1),
+    })
+    return summary
+
+
+def _wsgi_environ(url):
+    path, _, query = url.partition('?')
+    return {
+        'REQUEST_METHOD': 'GET',
+        'SCRIPT_NAME': '',
+        'PATH_INFO': path,
+        'QUERY_STRING': query,
+        'SERVER_NAME': 'testserver',
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': 'testserver',
+        'REMOTE_ADDR': '127.0.0.1',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': BytesIO(),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+
+
+def serve_wsgi(urls, requests, workers):
+    """
+    ``requests`` GETs cycling through ``urls``, through the WSGI handler on
+    ``workers`` threads: what that many sync workers can serve at once.
+    """
+    with override_settings(ROOT_URLCONF='blog.urls'):
+        handler = WSGIHandler()
+
+        def get(url):
+            statuses = []
+            start = time.perf_counter()
+            response = handler(_wsgi_environ(url), lambda status, headers: statuses.append(status))
+            b''.join(response)
+            response.close()
+            return (time.perf_counter() - start) * 1000, statuses[0].startswith('200')
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(get, (urls[i % len(urls)] for i in range(requests))))
+        elapsed = time.perf_counter() - start
+    return _throughput([ms for ms, _ in results], elapsed, sum(1 for _, ok in results if not ok))
+
+
+async def _asgi_get(handler, url):
+    path, _, query = url.partition('?')
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': query.encode(),
+        'root_path': '',
+        'headers': [(b'host', b'testserver')],
+        'client': ('127.0.0.1', 0),
+        'server': ('testserver', 80),
+    }
+    finished = asyncio.Event()
+    messages = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+    status = None
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        # Django listens for a disconnect while the view runs
+        await finished.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+        elif not message.get('more_body'):
+            finished.set()
+
+    start = time.perf_counter()
+    await handler(scope, receive, send)
+    finished.set()
+    return (time.perf_counter() - start) * 1000, status == 200
+
+
+def serve_asgi(urls, requests, concurrency):
+    """
+    ``requests`` GETs cycling through ``urls``, through the ASGI handler
+    with up to ``concurrency`` in flight on one event loop
+    """
+    with override_settings(ROOT_URLCONF='blog.asgi_urls'):
+        handler = ASGIHandler()
+
+        async def main():
+            slots = asyncio.Semaphore(concurrency)
+
+            async def get(url):
+                async with slots:
+                    return await _asgi_get(handler, url)
+
+            return await asyncio.gather(*(get(urls[i % len(urls)]) for i in range(requests)))
+
+        start = time.perf_counter()
+        results = asyncio.run(main())
+        elapsed = time.perf_counter() - start
+    return _throughput([ms for ms, _ in results], elapsed, sum(1 for _, ok in results if not ok))
+
+
+def report(views, scale, requests, warm, authenticated, label=''):
+    return {
+        'meta': {
+            'label': label,
+            'created_at': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'scale': scale,
+            'requests': requests,
+            'warm_cache': warm,
+            'authenticated': authenticated,
+        },
+        'views': views,
+    }
+
+
+def compare(current, baseline, threshold=0.2, metric='p95_ms'):
+    """
+    Regressions of ``current`` against ``baseline``: views whose ``metric``
+    grew by more than ``threshold`` (a fraction) or that run more queries.
+    Returns a list of human-readable descriptions, empty when all is well.
+    """
+    regressions = []
+    for name, now in current['views'].items():
+        before = baseline['views'].get(name)
+        if before is None:
+            continue
+        if before[metric] and now[metric] > before[metric] * (1 + threshold):
+            change = (now[metric] / before[metric] - 1) * 100
+            regressions.append(
+                f"{name}: {metric} {before[metric]:.2f} -> {now[metric]:.2f} (+{change:.0f}%)"
+            )
+        if now['queries_max'] > before['queries_max']:
+            regressions.append(
+                f"{name}: queries {before['queries_max']} -> {now['queries_max']}"
+            )
+    return regressions
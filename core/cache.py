@@ -0,0 +1,180 @@
+import hashlib
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import cache
+from . import cdn
+
+# Each namespace has a version counter that signal receivers bump whenever
+# the underlying rows change. Cache keys embed the versions they were built
+# from, so invalidation is a single incr and stale entries simply age out.
+ARTICLES = 'articles'
+CATEGORIES = 'categories'
+COMMENTS = 'comments'
+LIKES = 'likes'
+PROFILES = 'profiles'
+NAMESPACES = (ARTICLES, CATEGORIES, COMMENTS, LIKES, PROFILES)
+# Bumped by each trending rebuild; kept out of NAMESPACES so pages keyed on
+# all of them survive the periodic refresh.
+TRENDING = 'trending'
+
+VERSION_KEY_PREFIX = 'version:'
+CHANGED_KEY_PREFIX = 'changed:'
+PAGE_KEY_PREFIX = 'page:'
+VALUE_KEY_PREFIX = 'value:'
+
+
+def _version_key(namespace):
+    return f"{VERSION_KEY_PREFIX}{namespace}"
+
+
+def _fresh_version():
+    # Seeded from the clock so an evicted counter never restarts at a value
+    # an old cache entry was built with.
+    return time.time_ns()
+
+
+def get_versions(namespaces=NAMESPACES):
+    """Current version of each namespace, fetched in one cache round-trip"""
+    keys = [_version_key(namespace) for namespace in namespaces]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, _fresh_version(), None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+async def aget_versions(namespaces=NAMESPACES):
+    keys = [_version_key(namespace) for namespace in namespaces]
+    found = await cache.aget_many(keys)
+    for key in keys:
+        if key not in found:
+            await cache.aadd(key, _fresh_version(), None)
+            found[key] = await cache.aget(key)
+    return [found[key] for key in keys]
+
+
+def bump(*namespaces):
+    for namespace in namespaces:
+        key = _version_key(namespace)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _fresh_version(), None)
+    cache.set_many({f"{CHANGED_KEY_PREFIX}{namespace}": time.time() for namespace in namespaces}, None)
+    cdn.queue_purge(namespaces)
+
+
+def last_changed(namespaces=NAMESPACES):
+    """
+    When any of ``namespaces`` was last bumped, as a UNIX timestamp, or None
+    if that is not known for all of them (never bumped, or evicted)
+    """
+    keys = [f"{CHANGED_KEY_PREFIX}{namespace}" for namespace in namespaces]
+    found = cache.get_many(keys)
+    if len(found) < len(keys):
+        return None
+    return max(found.values())
+
+
+def content_version(namespaces=NAMESPACES):
+    """A single token that changes whenever any of ``namespaces`` does"""
+    return '.'.join(str(version) for version in get_versions(namespaces))
+
+
+async def acontent_version(namespaces=NAMESPACES):
+    return '.'.join(str(version) for version in await aget_versions(namespaces))
+
+
+async def alast_changed(namespaces=NAMESPACES):
+    keys = [f"{CHANGED_KEY_PREFIX}{namespace}" for namespace in namespaces]
+    found = await cache.aget_many(keys)
+    if len(found) < len(keys):
+        return None
+    return max(found.values())
+
+
+def cached_value(name, namespaces, compute, timeout=None):
+    """
+    ``compute()``, cached until any of ``namespaces`` changes (or for
+    ``timeout`` seconds, by default CACHE_FRAGMENT_TIMEOUT)
+    """
+    key = f"{VALUE_KEY_PREFIX}{name}:{content_version(namespaces)}"
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        cache.set(key, value, settings.CACHE_FRAGMENT_TIMEOUT if timeout is None else timeout)
+    return value
+
+
+async def acached_value(name, namespaces, compute, timeout=None):
+    """``cached_value()`` for an async ``compute()``"""
+    key = f"{VALUE_KEY_PREFIX}{name}:{await acontent_version(namespaces)}"
+    value = await cache.aget(key)
+    if value is None:
+        value = await compute()
+        await cache.aset(key, value, settings.CACHE_FRAGMENT_TIMEOUT if timeout is None else timeout)
+    return value
+
+
+def _path_key(request):
+    return hashlib.md5(request.get_full_path().encode()).hexdigest()
+
+
+def _page_key(request, namespaces):
+    return f"{PAGE_KEY_PREFIX}{_path_key(request)}:{content_version(namespaces)}"
+
+
+async def _apage_key(request, namespaces):
+    return f"{PAGE_KEY_PREFIX}{_path_key(request)}:{await acontent_version(namespaces)}"
+
+
+def _cacheable(request, user):
+    return (request.method == 'GET' and not user.is_authenticated
+            and not len(messages.get_messages(request)))
+
+
+def cache_anonymous_page(*namespaces):
+    """
+    Serve whole rendered pages to anonymous GET requests from the cache.
+    Authenticated users, requests with pending flash messages and responses
+    that set cookies always go through the view. The anonymous pages are
+    also the ones a CDN may share (core.cdn).
+    """
+    def decorator(view_func):
+        if iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def async_wrapper(request, *args, **kwargs):
+                # auser() loads the session without blocking, so the message
+                # check that follows does no I/O of its own
+                if not _cacheable(request, await request.auser()):
+                    return cdn.private(await view_func(request, *args, **kwargs))
+
+                key = await _apage_key(request, namespaces)
+                response = await cache.aget(key)
+                if response is None:
+                    response = await view_func(request, *args, **kwargs)
+                    if response.status_code == 200 and not response.cookies:
+                        await cache.aset(key, response, settings.CACHE_PAGE_TIMEOUT)
+                return cdn.tag(response, namespaces)
+            return async_wrapper
+
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if not _cacheable(request, request.user):
+                return cdn.private(view_func(request, *args, **kwargs))
+
+            key = _page_key(request, namespaces)
+            response = cache.get(key)
+            if response is None:
+                response = view_func(request, *args, **kwargs)
+                if response.status_code == 200 and not response.cookies:
+                    cache.set(key, response, settings.CACHE_PAGE_TIMEOUT)
+            return cdn.tag(response, namespaces)
+        return wrapper
+    return decorator
@@ -0,0 +1,86 @@
+"""
+Shared (CDN / reverse proxy) caching of anonymous pages.
+
+With CDN_CACHE_SECONDS set, the anonymous responses ``cache_anonymous_page``
+would cache are sent as ``Cache-Control: public, s-maxage`` and tagged with
+their cache namespaces in CDN_TAG_HEADER; SharedCacheMiddleware applies the
+headers once the session and CSRF middleware are done with the response.
+The same pages for logged-in users are marked private. The proxy has to
+pass through, uncached, requests carrying the session or messages cookie.
+
+Anonymous pages hold no forms and so no CSRF token, and one copy serves
+every anonymous visitor. Whenever ``core.cache.bump()`` invalidates
+namespaces, ``queue_purge()`` records their tags in the writer's
+transaction; ``manage.py run_cdn_purger`` hands what accumulated to
+CDN_PURGE_BACKEND every CDN_PURGE_INTERVAL seconds, so a slow purge API
+never holds up a like or comment and a burst of them is one purge.
+"""
+
+import requests
+from django.conf import settings
+from django.db import transaction
+from django.utils.cache import cc_delim_re, patch_cache_control
+from django.utils.module_loading import import_string
+from .models import PendingPurge
+
+
+def tag(response, namespaces):
+    """Mark an anonymous page the proxy may share, invalidated with ``namespaces``"""
+    response.cdn_tags = tuple(namespaces) if response.status_code == 200 else ()
+    return response
+
+
+def private(response):
+    """Mark a page that was rendered for one visitor"""
+    response.cdn_tags = ()
+    return response
+
+
+def share(response):
+    patch_cache_control(response, public=True, max_age=0, s_maxage=settings.CDN_CACHE_SECONDS)
+    response[settings.CDN_TAG_HEADER] = ' '.join(response.cdn_tags)
+    # Sessions bypass the proxy, so splitting its copies by cookie would
+    # only fragment them
+    vary = [field for field in cc_delim_re.split(response.get('Vary', '')) if field and field.lower() != 'cookie']
+    if vary:
+        response['Vary'] = ', '.join(vary)
+    elif response.has_header('Vary'):
+        del response['Vary']
+    return response
+
+
+def http_purge(tags):
+    """POST ``{"tags": [...]}`` to CDN_PURGE_URL, as tag-based purge APIs take"""
+    headers = {'Authorization': f"Bearer {settings.CDN_PURGE_TOKEN}"} if settings.CDN_PURGE_TOKEN else {}
+    response = requests.post(
+        settings.CDN_PURGE_URL, json={'tags': list(tags)}, headers=headers,
+        timeout=settings.CDN_PURGE_TIMEOUT,
+    )
+    response.raise_for_status()
+
+
+def queue_purge(namespaces):
+    if settings.CDN_CACHE_SECONDS and settings.CDN_PURGE_BACKEND:
+        PendingPurge.objects.bulk_create(
+            [PendingPurge(tag=namespace) for namespace in namespaces], ignore_conflicts=True,
+        )
+
+
+def purge_pending():
+    """
+    Purge every queued tag in one call to CDN_PURGE_BACKEND; returns them.
+    The rows are removed first, so a change committed meanwhile queues its
+    tag again, and put back if the purge fails.
+    """
+    with transaction.atomic():
+        tags = list(PendingPurge.objects.select_for_update(skip_locked=True).values_list('tag', flat=True))
+        PendingPurge.objects.filter(tag__in=tags).delete()
+    if not tags:
+        return []
+    try:
+        import_string(settings.CDN_PURGE_BACKEND)(tags)
+    except Exception:
+        # Copies still expire after CDN_CACHE_SECONDS meanwhile
+        queue_purge(tags)
+        raise
+    return tags
@@ -0,0 +1,224 @@
+"""
+Conditional GET for article and list pages.
+
+Validators are built from the cache version counters in core.cache (plus,
+for logged-in readers of an article, one indexed lookup), so answering 304
+costs a cache round-trip instead of the view's queries and rendering. Anything
+the page renders differently per visitor goes into the ETag; logged-in
+visitors get no Last-Modified, which cannot carry those bits.
+
+Async views get async validators: Django's ``condition`` always calls them
+synchronously, so those are wrapped here instead.
+"""
+import hashlib
+import math
+import time
+from datetime import datetime, timezone as dt_timezone
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.contrib import messages
+from django.contrib.auth.models import User
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import condition
+from accounts.models import Profile
+from . import cache
+from .models import Article, Like
+
+
+def _skip(request):
+    # Pending flash messages are rendered into the page, so never 304 them away
+    return bool(len(messages.get_messages(request)))
+
+
+async def _askip(request):
+    # Resolving the user loads the session, so the message check stays off the DB
+    await request.auser()
+    return _skip(request)
+
+
+def viewer_token(request):
+    """Everything about the visitor that changes how a page renders"""
+    user = request.user
+    if not user.is_authenticated:
+        return 'anonymous'
+    return _viewer_token(request, user, getattr(user, 'profile', None))
+
+
+async def aviewer_token(request):
+    user = await request.auser()
+    if not user.is_authenticated:
+        return 'anonymous'
+    if User.profile.is_cached(user):
+        profile = user.profile
+    else:
+        profile = await Profile.objects.filter(user=user).afirst()
+    return _viewer_token(request, user, profile)
+
+
+def _viewer_token(request, user, profile):
+    return ':'.join(str(bit) for bit in (
+        user.pk, user.username, user.first_name,
+        profile.avatar.name if profile and profile.avatar else '',
+        # Forms carry a token derived from the CSRF secret, which rotates on login
+        request.META.get('CSRF_COOKIE', ''),
+    ))
+
+
+def _etag(*bits):
+    return hashlib.md5('|'.join(str(bit) for bit in bits).encode()).hexdigest()
+
+
+def _last_modified(request, namespaces):
+    if request.user.is_authenticated:
+        return None
+    return _as_datetime(cache.last_changed(namespaces))
+
+
+async def _alast_modified(request, namespaces):
+    if (await request.auser()).is_authenticated:
+        return None
+    return _as_datetime(await cache.alast_changed(namespaces))
+
+
+def _as_datetime(changed):
+    if changed is None:
+        return None
+    # HTTP dates are whole seconds, so round up; until that second is over a
+    # further change would get the same date, so leave Last-Modified off.
+    changed = math.ceil(changed)
+    if changed > time.time():
+        return None
+    return datetime.fromtimestamp(changed, dt_timezone.utc)
+
+
+def _condition(etag_func, last_modified_func, aetag_func, alast_modified_func):
+    """``condition()``, awaiting the async validators when the view is async"""
+    def decorator(view_func):
+        if not iscoroutinefunction(view_func):
+            return condition(etag_func=etag_func, last_modified_func=last_modified_func)(view_func)
+
+        @wraps(view_func)
+        async def wrapper(request, *args, **kwargs):
+            modified = await alast_modified_func(request, *args, **kwargs)
+            modified = int(modified.timestamp()) if modified else None
+            etag = await aetag_func(request, *args, **kwargs)
+            etag = quote_etag(etag) if etag is not None else None
+
+            response = get_conditional_response(request, etag=etag, last_modified=modified)
+            if response is None:
+                response = await view_func(request, *args, **kwargs)
+            if request.method in ('GET', 'HEAD'):
+                if modified and not response.has_header('Last-Modified'):
+                    response.headers['Last-Modified'] = http_date(modified)
+                if etag:
+                    response.headers.setdefault('ETag', etag)
+            return response
+        return wrapper
+    return decorator
+
+
+def list_page(*namespaces):
+    """
+    Conditional GET for a feed cached on ``namespaces``: any change to those
+    (new or edited articles, likes, profiles...) changes the validators.
+    """
+    def etag(request, *args, **kwargs):
+        if _skip(request):
+            return None
+        return _etag(request.get_full_path(), cache.content_version(namespaces), viewer_token(request))
+
+    def last_modified(request, *args, **kwargs):
+        if _skip(request):
+            return None
+        return _last_modified(request, namespaces)
+
+    async def aetag(request, *args, **kwargs):
+        if await _askip(request):
+            return None
+        return _etag(
+            request.get_full_path(), await cache.acontent_version(namespaces), await aviewer_token(request),
+        )
+
+    async def alast_modified(request, *args, **kwargs):
+        if await _askip(request):
+            return None
+        return await _alast_modified(request, namespaces)
+
+    return _condition(etag, last_modified, aetag, alast_modified)
+
+
+def _article_state(request, slug):
+    """The article's validator inputs, looked up once per request"""
+    if not hasattr(request, '_article_state'):
+        state = (
+            Article.objects.published().filter(slug=slug)
+            .values('pk', 'created_at', 'like_count', 'comment_count').first()
+        )
+        if state is not None:
+            state['liked'] = Like.objects.filter(article_id=state['pk'], user=request.user).exists()
+        request._article_state = state
+    return request._article_state
+
+
+async def _aarticle_state(request, slug):
+    if not hasattr(request, '_article_state'):
+        state = await (
+            Article.objects.published().filter(slug=slug)
+            .values('pk', 'created_at', 'like_count', 'comment_count').afirst()
+        )
+        if state is not None:
+            state['liked'] = await Like.objects.filter(
+                article_id=state['pk'], user=await request.auser(),
+            ).aexists()
+        request._article_state = state
+    return request._article_state
+
+
+def _article_etag(request, state, version, viewer):
+    if state is None:
+        return None
+    return _etag(
+        request.get_full_path(), state['pk'], state['created_at'].isoformat(),
+        state['like_count'], state['comment_count'], state['liked'], version, viewer,
+    )
+
+
+def article_page(*namespaces):
+    """
+    Conditional GET for article_detail. Anonymous visitors are validated on
+    the versions of ``namespaces`` alone, exactly as the page cache is, so
+    revalidating costs no query. Logged-in visitors (who bypass the page
+    cache) also get the article's modification time, like/comment counts
+    and their own like state, from one indexed lookup.
+    """
+    def etag(request, slug):
+        if _skip(request):
+            return None
+        if not request.user.is_authenticated:
+            return _etag(request.get_full_path(), cache.content_version(namespaces), viewer_token(request))
+        return _article_etag(
+            request, _article_state(request, slug),
+            cache.content_version(namespaces), viewer_token(request),
+        )
+
+    def last_modified(request, slug):
+        if _skip(request):
+            return None
+        return _last_modified(request, namespaces)
+
+    async def aetag(request, slug):
+        if await _askip(request):
+            return None
+        version, viewer = await cache.acontent_version(namespaces), await aviewer_token(request)
+        if not (await request.auser()).is_authenticated:
+            return _etag(request.get_full_path(), version, viewer)
+        return _article_etag(request, await _aarticle_state(request, slug), version, viewer)
+
+    async def alast_modified(request, slug):
+        if await _askip(request):
+            return None
+        return await _alast_modified(request, namespaces)
+
+    return _condition(etag, last_modified, aetag, alast_modified)
@@ -0,0 +1,13 @@
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject
+from .cache import ARTICLES, CATEGORIES, PROFILES, content_version
+
+
+def fragment_cache(request):
+    """Key and timeout for {% cache %} fragments, looked up only if a template uses them"""
+    return {
+        # Only what an article card or body shows: likes and comments are
+        # rendered outside the fragments, so they do not invalidate them
+        'article_version': SimpleLazyObject(lambda: content_version((ARTICLES, CATEGORIES, PROFILES))),
+        'fragment_cache_timeout': settings.CACHE_FRAGMENT_TIMEOUT,
+    }
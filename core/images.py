@@ -0,0 +1,139 @@
+"""
+Resized and WebP derivatives of uploaded images.
+
+Variants are generated with Pillow from the upload while it is still in
+memory, written next to the original through the field's storage, and
+recorded on the model as a list of ``{"width", "format", "name"}`` dicts
+that the ``responsive_img`` template tag turns into ``srcset``.
+"""
+import logging
+import os
+import uuid
+from functools import partial
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.db import router, transaction
+from PIL import Image, ImageOps
+
+logger = logging.getLogger('core.images')
+
+COVER_WIDTHS = (480, 960, 1440)
+CATEGORY_WIDTHS = (320, 640)
+AVATAR_WIDTHS = (64, 128)
+
+WEBP_QUALITY = 80
+JPEG_QUALITY = 85
+
+
+def has_new_upload(field_file):
+    """True when the field holds a file that has not been stored yet"""
+    return bool(field_file) and not field_file._committed
+
+
+def _fallback_format(image):
+    has_alpha = image.mode in ('RGBA', 'LA') or 'transparency' in image.info
+    return 'png' if has_alpha else 'jpeg'
+
+
+def _encode(image, fmt):
+    buffer = BytesIO()
+    if fmt == 'webp':
+        image.save(buffer, 'WEBP', quality=WEBP_QUALITY, method=4)
+    elif fmt == 'png':
+        image.save(buffer, 'PNG', optimize=True)
+    else:
+        image.convert('RGB').save(buffer, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def generate_variants(field_file, widths, square=False):
+    """
+    Write a fallback-format and a WebP copy of ``field_file`` at each width
+    (never upscaling) and return their descriptors. ``square`` centre-crops
+    first, for avatars. An upload Pillow cannot read gets no variants, so
+    pages fall back to the original file.
+    """
+    variants = []
+    try:
+        _write_variants(field_file, widths, square, variants)
+    except (OSError, Image.DecompressionBombError) as exc:
+        logger.warning("Could not generate variants of %s: %s", field_file.name, exc)
+        delete_variants(variants, field_file.storage)
+        variants = []
+    finally:
+        field_file.file.seek(0)
+    return variants
+
+
+def _write_variants(field_file, widths, square, variants):
+    upload = field_file.file
+    upload.seek(0)
+    with Image.open(upload) as source:
+        source = ImageOps.exif_transpose(source)
+        source.load()
+
+    if square:
+        side = min(source.size)
+        source = ImageOps.fit(source, (side, side))
+
+    fallback = _fallback_format(source)
+    if fallback == 'png' and source.mode not in ('RGBA', 'LA'):
+        source = source.convert('RGBA')
+    elif fallback == 'jpeg' and source.mode not in ('RGB', 'L'):
+        source = source.convert('RGB')
+
+    folder = os.path.join(os.path.dirname(field_file.field.generate_filename(None, 'x')), 'variants')
+    stem = uuid.uuid4().hex[:12]
+    storage = field_file.storage
+
+    for width in sorted({min(width, source.width) for width in widths}):
+        height = round(source.height * width / source.width)
+        resized = source if width == source.width else source.resize((width, height), Image.LANCZOS)
+        for fmt in ('webp', fallback):
+            name = storage.save(
+                os.path.join(folder, f"{stem}-{width}.{fmt}"),
+                ContentFile(_encode(resized, fmt)),
+            )
+            variants.append({'width': width, 'format': fmt, 'name': name})
+
+
+def delete_variants(variants, storage):
+    for variant in variants or []:
+        try:
+            storage.delete(variant['name'])
+        except OSError:
+            # A leftover derivative is harmless; never fail the save over it
+            logger.warning("Could not delete image variant %s", variant['name'], exc_info=True)
+
+
+def refresh_variants(instance, field_name, variants_attr, widths, square=False):
+    """
+    Call from ``save()`` before the row is written: regenerates the variants
+    when a new file was uploaded and drops them when the image was cleared.
+    Returns the replaced variants, for ``discard_variants()`` once saved.
+    """
+    field_file = getattr(instance, field_name)
+    old_variants = getattr(instance, variants_attr)
+
+    if has_new_upload(field_file):
+        setattr(instance, variants_attr, generate_variants(field_file, widths, square))
+    elif not field_file and old_variants:
+        setattr(instance, variants_attr, [])
+    else:
+        return []
+    return old_variants
+
+
+def discard_variants(instance, field_name, variants):
+    """
+    Call from ``save()`` after the row is written: deletes the variants
+    ``refresh_variants()`` replaced once the save commits, so a rolled-back
+    save still finds the files its row points at.
+    """
+    if variants:
+        storage = getattr(instance, field_name).storage
+        transaction.on_commit(
+            partial(delete_variants, variants, storage),
+            using=router.db_for_write(type(instance), instance=instance),
+        )
@@ -0,0 +1,80 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from core import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway test database and compare how many concurrent page requests "
+        "the WSGI (sync views) and ASGI (core.async_views) paths serve per second"
+    )
+
+    def add_arguments(self, parser):
+        for name, default in benchmark.DEFAULT_SCALE.items():
+            parser.add_argument(f'--{name}', type=int, default=default, help=f"Synthetic {name} to seed")
+        parser.add_argument(
+            '--scale', type=float, default=1.0,
+            help="Multiply every seeded count by this factor",
+        )
+        parser.add_argument('--requests', type=int, default=500, help="Requests per serving path")
+        parser.add_argument(
+            '--concurrency', type=int, default=32,
+            help="Requests in flight at once on the ASGI path",
+        )
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help="Sync workers (threads) on the WSGI path, as gunicorn --workers",
+        )
+        parser.add_argument(
+            '--warm', action='store_true',
+            help="Serve from a local page cache instead of rendering every request",
+        )
+        parser.add_argument('--seed', type=int, default=0, help="Random seed for data and URLs")
+        parser.add_argument('--label', default='', help="Free-form label stored in the report, e.g. a commit")
+        parser.add_argument('--output', '-o', help="Write the JSON report here instead of stdout")
+
+    def handle(self, *args, **options):
+        if min(options['requests'], options['concurrency'], options['workers']) < 1:
+            raise CommandError("--requests, --concurrency and --workers must be positive.")
+
+        scale = {
+            name: max(1, round(options[name] * options['scale']))
+            for name in benchmark.DEFAULT_SCALE
+        }
+        backend = 'locmem.LocMemCache' if options['warm'] else 'dummy.DummyCache'
+
+        with benchmark.throwaway_database({'default': {
+            'BACKEND': f'django.core.cache.backends.{backend}',
+            'LOCATION': 'bench-serving',
+        }}):
+            start = time.perf_counter()
+            benchmark.seed(**scale, random_seed=options['seed'])
+            self.stderr.write(f"Seeded {scale} in {time.perf_counter() - start:.1f}s")
+
+            urls = benchmark.serving_urls(options['seed'])
+            # Imports, templates and (with --warm) the page cache, before either path is timed
+            for url in urls:
+                benchmark.serve_wsgi([url], 1, 1)
+            paths = {
+                'wsgi': benchmark.serve_wsgi(urls, options['requests'], options['workers']),
+                'asgi': benchmark.serve_asgi(urls, options['requests'], options['concurrency']),
+            }
+
+        result = benchmark.report(paths, scale, options['requests'], options['warm'], False, label=options['label'])
+        result['meta'].update(concurrency=options['concurrency'], workers=options['workers'])
+        output = json.dumps(result, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as handle:
+                handle.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+        for name, summary in paths.items():
+            self.stderr.write(
+                f"{name:<5} {summary['throughput_rps']:8.1f} req/s  p50 {summary['p50_ms']:8.2f}ms  "
+                f"p95 {summary['p95_ms']:8.2f}ms  errors {summary['errors']}"
+            )
+        if any(summary['errors'] for summary in paths.values()):
+            raise CommandError("Some requests did not return 200.")
@@ -0,0 +1,71 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import import_string
+from core.models import Article
+
+
+def page_image_names(articles):
+    """Every storage name a feed page resolves: covers, avatars and their variants"""
+    names = []
+    for article in articles:
+        if article.cover_image:
+            names.append(article.cover_image.name)
+            names.extend(variant['name'] for variant in article.cover_variants)
+        profile = getattr(article.author, 'profile', None)
+        if profile is not None and profile.avatar:
+            names.append(profile.avatar.name)
+            names.extend(variant['name'] for variant in profile.avatar_variants)
+    return names
+
+
+class Command(BaseCommand):
+    help = "Compare storage URL resolution cost per feed page with and without the url() cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=200, help="Page renders to simulate")
+        parser.add_argument(
+            '--synthetic', type=int, default=0,
+            help="Use N made-up image names (12 cards, shared avatars) instead of the database",
+        )
+
+    def handle(self, *args, **options):
+        if options['synthetic']:
+            count = options['synthetic']
+            names = [f"covers/variants/bench{i}-480.webp" for i in range(count)]
+            names += [f"avatars/bench{i % 4}.png" for i in range(count)]
+        else:
+            articles = Article.objects.published().feed()[:settings.ARTICLE_FEED_PAGE_SIZE]
+            names = page_image_names(articles)
+        if not names:
+            self.stdout.write("No images on the first feed page; try --synthetic 12.")
+            return
+
+        backend = import_string(settings.STORAGES['default']['OPTIONS']['backend'])()
+        pages = options['pages']
+
+        def per_page(storage):
+            start = time.perf_counter()
+            for _ in range(pages):
+                for name in names:
+                    storage.url(name)
+            return (time.perf_counter() - start) / pages * 1e6
+
+        uncached = per_page(backend)
+
+        cache.delete_many([default_storage._shared_key(name) for name in names])
+        for name in set(names):
+            default_storage._lru.pop(name, None)
+        start = time.perf_counter()
+        for name in names:
+            default_storage.url(name)
+        cold = (time.perf_counter() - start) * 1e6
+        warm = per_page(default_storage)
+
+        self.stdout.write(f"{len(names)} URL lookups per page ({len(set(names))} distinct), {pages} pages")
+        self.stdout.write(f"  backend url():          {uncached:10.1f} µs/page")
+        self.stdout.write(f"  cached, first page:     {cold:10.1f} µs/page")
+        self.stdout.write(f"  cached, warm:           {warm:10.1f} µs/page")
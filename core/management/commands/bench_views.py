@@ -0,0 +1,95 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from core import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway test database with synthetic content, request the public "
+        "views and write latency percentiles and query counts as JSON"
+    )
+
+    def add_arguments(self, parser):
+        for name, default in benchmark.DEFAULT_SCALE.items():
+            parser.add_argument(f'--{name}', type=int, default=default, help=f"Synthetic {name} to seed")
+        parser.add_argument(
+            '--scale', type=float, default=1.0,
+            help="Multiply every seeded count by this factor",
+        )
+        parser.add_argument('--requests', type=int, default=50, help="Requests per view")
+        parser.add_argument(
+            '--warm', action='store_true',
+            help="Keep the cache between requests (measures cached pages)",
+        )
+        parser.add_argument('--authenticated', action='store_true', help="Request as a logged-in user")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed for data and URLs")
+        parser.add_argument('--label', default='', help="Free-form label stored in the report, e.g. a commit")
+        parser.add_argument('--output', '-o', help="Write the JSON report here instead of stdout")
+        parser.add_argument('--compare', metavar='BASELINE', help="Report to check this run against")
+        parser.add_argument(
+            '--threshold', type=float, default=0.2,
+            help="Allowed p95 growth over the baseline, as a fraction (default 0.2)",
+        )
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare'], encoding='utf-8') as handle:
+                    baseline = json.load(handle)
+            except (OSError, ValueError) as exc:
+                raise CommandError(f"Cannot read baseline: {exc}")
+
+        scale = {
+            name: max(1, round(options[name] * options['scale']))
+            for name in benchmark.DEFAULT_SCALE
+        }
+
+        # A private cache, so clearing it between requests never touches a
+        # shared Redis or memcached
+        with benchmark.throwaway_database({'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'bench-views',
+        }}):
+            start = time.perf_counter()
+            benchmark.seed(**scale, random_seed=options['seed'])
+            self.stderr.write(f"Seeded {scale} in {time.perf_counter() - start:.1f}s")
+
+            views = benchmark.run(
+                requests=options['requests'], warm=options['warm'],
+                authenticated=options['authenticated'], random_seed=options['seed'],
+            )
+
+        result = benchmark.report(
+            views, scale, options['requests'], options['warm'],
+            options['authenticated'], label=options['label'],
+        )
+        output = json.dumps(result, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as handle:
+                handle.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+        for name, summary in views.items():
+            self.stderr.write(
+                f"{name:<18} p50 {summary['p50_ms']:8.2f}ms  p95 {summary['p95_ms']:8.2f}ms  "
+                f"queries {summary['queries_max']}"
+            )
+
+        if baseline is not None:
+            settings_compared = ('scale', 'requests', 'warm_cache', 'authenticated', 'database')
+            differing = [
+                key for key in settings_compared
+                if baseline.get('meta', {}).get(key) != result['meta'][key]
+            ]
+            if differing:
+                self.stderr.write(self.style.WARNING(
+                    f"Baseline was run with different {', '.join(differing)}; numbers may not compare."
+                ))
+            regressions = benchmark.compare(result, baseline, options['threshold'])
+            if regressions:
+                raise CommandError("Regressions against baseline:\n  " + "\n  ".join(regressions))
+            self.stderr.write(self.style.SUCCESS("No regressions against the baseline."))
@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+from core.trending import rebuild
+
+
+class Command(BaseCommand):
+    help = "Rebuild the trending ranking from recent likes and comments; run periodically (e.g. every 10 minutes)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--size', type=int,
+            help="Articles to keep in the ranking (default TRENDING_SIZE)",
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        ranked = rebuild(size=options['size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Ranked {ranked} trending article(s) in {time.perf_counter() - start:.2f}s."
+        ))
@@ -0,0 +1,190 @@
+import json
+import sys
+import time
+from contextlib import nullcontext
+from itertools import islice
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.core.validators import slug_re
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from core import cache
+from core.models import Article, Category, allocate_slugs
+from core.search import index_articles
+
+STATUSES = {value for value, _ in Article.STATUS_CHOICES}
+TITLE_MAX_LENGTH = Article._meta.get_field('title').max_length
+SLUG_MAX_LENGTH = Article._meta.get_field('slug').max_length
+CATEGORY_MAX_LENGTH = Category._meta.get_field('name').max_length
+
+
+def read_records(stream):
+    """Yield ``(line_number, record)`` for each non-blank JSON line"""
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as exc:
+            raise CommandError(f"Line {number}: invalid JSON ({exc})")
+        if not isinstance(record, dict):
+            raise CommandError(f"Line {number}: expected a JSON object")
+        yield number, record
+
+
+def resolve_categories(lines):
+    """
+    Map category names to ids, creating the ones that do not exist yet.
+    ``lines`` maps each name to the first line it appears on, for errors.
+    """
+    found = dict(Category.objects.filter(name__in=lines).values_list('name', 'id'))
+    missing = sorted(lines.keys() - found.keys())
+    if missing:
+        Category.objects.bulk_create(
+            [Category(name=name, slug=slug)
+             for name, slug in zip(missing, allocate_slugs(missing, Category.objects.all()))],
+            ignore_conflicts=True,
+        )
+        found.update(Category.objects.filter(name__in=missing).values_list('name', 'id'))
+    for name in missing:
+        if name not in found:
+            # Another writer took the slug between allocation and insert
+            raise CommandError(f"Line {lines[name]}: could not create category {name!r}, try again")
+    return found
+
+
+class Command(BaseCommand):
+    help = (
+        "Import articles from JSON Lines, one article per line: "
+        '{"title", "content", "author" (username), "status", "published_at", "categories" (names), '
+        '"slug" (kept when free, as written by export_articles)}. Each batch commits on its own '
+        "unless --atomic is given, so a bad line stops the import after the batches before it"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="JSON Lines file to read, or - for stdin")
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help="Articles inserted per bulk_create",
+        )
+        parser.add_argument(
+            '--atomic', action='store_true',
+            help="Import everything in one transaction, so a bad line leaves nothing behind",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError("--batch-size must be at least 1")
+
+        if options['path'] == '-':
+            stream = sys.stdin
+        else:
+            try:
+                stream = open(options['path'], encoding='utf-8')
+            except OSError as exc:
+                raise CommandError(exc)
+
+        imported = 0
+        start = time.perf_counter()
+        try:
+            with transaction.atomic() if options['atomic'] else nullcontext():
+                records = read_records(stream)
+                while batch := list(islice(records, batch_size)):
+                    imported += self.import_batch(batch)
+                    if options['verbosity'] > 1:
+                        self.stdout.write(f"{imported} article(s) imported...")
+        except CommandError as exc:
+            if imported and not options['atomic']:
+                raise CommandError(f"{exc} ({imported} article(s) from earlier batches were committed)")
+            raise
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+            if imported:
+                # bulk_create skips the signals that normally do this
+                cache.bump(cache.ARTICLES, cache.CATEGORIES)
+
+        elapsed = time.perf_counter() - start
+        rate = imported / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {imported} article(s) in {elapsed:.2f}s ({rate:.0f} rows/sec)."
+        ))
+
+    def import_batch(self, batch):
+        usernames = {record.get('author') for _, record in batch}
+        authors = dict(User.objects.filter(username__in=usernames).values_list('username', 'id'))
+
+        articles = []
+        article_categories = []
+        category_lines = {}
+        slugs = []
+        for number, record in batch:
+            title = record.get('title')
+            content = record.get('content')
+            if not isinstance(title, str) or not title.strip() or not isinstance(content, str):
+                raise CommandError(f"Line {number}: title and content are required")
+            if len(title) > TITLE_MAX_LENGTH:
+                raise CommandError(f"Line {number}: title is longer than {TITLE_MAX_LENGTH} characters")
+            slug = record.get('slug')
+            if slug is not None and not (
+                    isinstance(slug, str) and len(slug) <= SLUG_MAX_LENGTH and slug_re.match(slug)):
+                raise CommandError(f"Line {number}: invalid slug {slug!r}")
+            if record.get('author') not in authors:
+                raise CommandError(f"Line {number}: unknown author {record.get('author')!r}")
+
+            status = record.get('status') or Article.DRAFT
+            if status not in STATUSES:
+                raise CommandError(f"Line {number}: unknown status {status!r}")
+
+            published_at = None
+            if record.get('published_at'):
+                published_at = parse_datetime(record['published_at'])
+                if published_at is None:
+                    raise CommandError(f"Line {number}: invalid published_at")
+                if timezone.is_naive(published_at):
+                    published_at = timezone.make_aware(published_at)
+            elif status == Article.PUBLISHED:
+                published_at = timezone.now()
+
+            categories = record.get('categories') or []
+            if not isinstance(categories, list) or not all(
+                    isinstance(name, str) and name.strip() for name in categories):
+                raise CommandError(f"Line {number}: categories must be a list of names")
+            if any(len(name) > CATEGORY_MAX_LENGTH for name in categories):
+                raise CommandError(
+                    f"Line {number}: category names are limited to {CATEGORY_MAX_LENGTH} characters"
+                )
+            for name in categories:
+                category_lines.setdefault(name, number)
+
+            article = Article(
+                title=title,
+                content=content,
+                author_id=authors[record['author']],
+                status=status,
+                published_at=published_at,
+            )
+            # bulk_create bypasses save(), so render here as save() would
+            article.render()
+            articles.append(article)
+            article_categories.append(categories)
+            slugs.append(slug)
+
+        with transaction.atomic():
+            for article, slug in zip(articles, allocate_slugs([a.title for a in articles], preferred=slugs)):
+                article.slug = slug
+            Article.objects.bulk_create(articles)
+
+            category_ids = resolve_categories(category_lines)
+            Through = Article.categories.through
+            Through.objects.bulk_create([
+                Through(article_id=article.pk, category_id=category_ids[name])
+                for article, names in zip(articles, article_categories)
+                for name in set(names)
+            ])
+            index_articles(article.pk for article in articles)
+
+        return len(articles)
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from core.models import Article, Comment, Like
+
+
+def count_subquery(model):
+    counts = (
+        model.objects.filter(article=OuterRef('pk'))
+        .order_by()
+        .values('article')
+        .annotate(total=Count('id'))
+        .values('total')
+    )
+    return Coalesce(Subquery(counts), Value(0))
+
+
+class Command(BaseCommand):
+    help = "Recompute Article.like_count and Article.comment_count from the Like and Comment tables"
+
+    def handle(self, *args, **options):
+        like_total = count_subquery(Like)
+        comment_total = count_subquery(Comment)
+
+        drifted = Article.objects.exclude(
+            like_count=like_total, comment_count=comment_total
+        ).count()
+        Article.objects.update(like_count=like_total, comment_count=comment_total)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Recounted likes and comments; {drifted} article(s) had drifted."
+        ))
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from core import cache
+from core.models import Article
+
+
+class Command(BaseCommand):
+    help = "Backfill Article.content_html, excerpt and content_hash in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help="Articles loaded and updated per round-trip",
+        )
+        parser.add_argument(
+            '--force', action='store_true',
+            help="Re-render every article, even if its content hash is unchanged",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        queryset = Article.objects.order_by('pk').only('pk', 'content', 'content_hash')
+
+        rendered = 0
+        last_pk = 0
+        try:
+            while True:
+                batch = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+                if not batch:
+                    break
+                last_pk = batch[-1].pk
+
+                changed = [
+                    article for article in batch
+                    if article.render(force=options['force'])
+                ]
+                Article.objects.bulk_update(changed, ['content_html', 'excerpt', 'content_hash'])
+                rendered += len(changed)
+        finally:
+            if rendered:
+                # bulk_update skips the signals that normally do this
+                cache.bump(cache.ARTICLES)
+
+        self.stdout.write(self.style.SUCCESS(f"Rendered {rendered} article(s)."))
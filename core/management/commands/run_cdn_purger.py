@@ -0,0 +1,38 @@
+import logging
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from core.cdn import purge_pending
+
+logger = logging.getLogger('core.cdn')
+
+
+class Command(BaseCommand):
+    help = "Purge the CDN tags queued by page changes, all of them in one call per interval"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help="Purge what is queued once and exit instead of polling forever",
+        )
+        parser.add_argument(
+            '--interval', type=float, default=settings.CDN_PURGE_INTERVAL,
+            help="Seconds between purges; changes within one interval share a purge",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            try:
+                tags = purge_pending()
+            except Exception:
+                # The tags were queued again and go out with the next purge
+                logger.exception("Purging queued tags from the CDN failed")
+                if options['once']:
+                    raise
+            else:
+                if tags:
+                    self.stdout.write(f"Purged {', '.join(sorted(tags))}")
+            if options['once']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,309 @@
+"""
+Per-request timing and query instrumentation.
+
+RequestMetricsMiddleware measures wall time, database queries (count and
+time, through ``connection.execute_wrapper``), template render time and
+cache hits/misses. Each request is logged as one JSON line on the
+``core.requests`` logger and summarised in a ``Server-Timing`` header;
+requests over the query or latency budget are logged as warnings.
+
+It only hooks anything when REQUEST_METRICS_ENABLED is set. Otherwise it
+removes itself from the middleware chain at startup.
+"""
+import contextvars
+import json
+import logging
+import time
+from contextlib import ExitStack
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.base import Template
+from django.utils.cache import patch_cache_control
+from whitenoise.middleware import WhiteNoiseMiddleware
+from . import cdn, routers
+
+logger = logging.getLogger('core.requests')
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # Nesting depth of instrumented calls, so includes and get_many()
+        # falling back to get() are not counted twice
+        self.template_depth = 0
+        self.cache_depth = 0
+
+    def db_wrapper(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+
+
+def _instrumented_render(render):
+    @wraps(render)
+    def wrapper(self, context):
+        metrics = _current.get()
+        if metrics is None or metrics.template_depth:
+            return render(self, context)
+        metrics.template_depth += 1
+        start = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            metrics.template_time += time.perf_counter() - start
+            metrics.template_depth -= 1
+    wrapper.instrumented = True
+    return wrapper
+
+
+_MISSING = object()
+
+
+def _instrument_cache(backend):
+    """Count hits and misses on one cache connection (once per instance)"""
+    if getattr(backend, '_metrics_instrumented', False):
+        return
+    get, get_many = backend.get, backend.get_many
+
+    def counted_get(key, default=None, version=None):
+        metrics = _current.get()
+        if metrics is None or metrics.cache_depth:
+            return get(key, default, version)
+        metrics.cache_depth += 1
+        try:
+            value = get(key, _MISSING, version)
+        finally:
+            metrics.cache_depth -= 1
+        if value is _MISSING:
+            metrics.cache_misses += 1
+            return default
+        metrics.cache_hits += 1
+        return value
+
+    def counted_get_many(keys, version=None):
+        metrics = _current.get()
+        if metrics is None or metrics.cache_depth:
+            return get_many(keys, version)
+        keys = list(keys)
+        metrics.cache_depth += 1
+        try:
+            found = get_many(keys, version)
+        finally:
+            metrics.cache_depth -= 1
+        metrics.cache_hits += len(found)
+        metrics.cache_misses += len(keys) - len(found)
+        return found
+
+    backend.get = counted_get
+    backend.get_many = counted_get_many
+    backend._metrics_instrumented = True
+
+
+def _wrap_connections(metrics):
+    """Install the query wrapper on this thread's connections; returns the undo stack"""
+    stack = ExitStack()
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(metrics.db_wrapper))
+    return stack
+
+
+class RequestMetricsMiddleware:
+    """Goes first in MIDDLEWARE so the timings cover the whole stack"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        if not getattr(Template.render, 'instrumented', False):
+            Template.render = _instrumented_render(Template.render)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            for alias in settings.CACHES:
+                _instrument_cache(caches[alias])
+            with _wrap_connections(metrics):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+
+        self.report(request, response, metrics)
+        return response
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            for alias in settings.CACHES:
+                _instrument_cache(caches[alias])
+            # Async ORM calls run on the request's thread-sensitive executor
+            # thread, so that is where the query wrapper has to go
+            stack = await sync_to_async(_wrap_connections)(metrics)
+            try:
+                response = await self.get_response(request)
+            finally:
+                await sync_to_async(stack.close)()
+        finally:
+            _current.reset(token)
+
+        self.report(request, response, metrics)
+        return response
+
+    def report(self, request, response, metrics):
+        total_ms = (time.perf_counter() - metrics.start) * 1000
+        db_ms = metrics.db_time * 1000
+        template_ms = metrics.template_time * 1000
+
+        over_budget = []
+        if metrics.queries > settings.REQUEST_QUERY_BUDGET:
+            over_budget.append('queries')
+        if total_ms > settings.REQUEST_TIME_BUDGET_MS:
+            over_budget.append('time')
+
+        match = getattr(request, 'resolver_match', None)
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'total_ms': round(total_ms, 2),
+            'db_queries': metrics.queries,
+            'db_ms': round(db_ms, 2),
+            'template_ms': round(template_ms, 2),
+            'cache_hits': metrics.cache_hits,
+            'cache_misses': metrics.cache_misses,
+            'over_budget': over_budget,
+        }
+        logger.log(logging.WARNING if over_budget else logging.INFO, json.dumps(record))
+
+        if settings.REQUEST_METRICS_SERVER_TIMING:
+            response['Server-Timing'] = ', '.join([
+                f'db;dur={db_ms:.1f};desc="{metrics.queries} queries"',
+                f'tpl;dur={template_ms:.1f}',
+                f'cache;desc="{metrics.cache_hits} hits, {metrics.cache_misses} misses"',
+                f'total;dur={total_ms:.1f}',
+            ])
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise that also runs natively under ASGI, so the async views below
+    it are not pushed through a thread per request. Lookups are in-memory;
+    file bodies are streamed by the server as before.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return await self.get_response(request)
+
+
+class PrimaryPinMiddleware:
+    """
+    Carries core.routers' read-your-writes pin across requests: after a
+    request that wrote, the visitor's reads stay on the primary for
+    DATABASE_PRIMARY_PIN_SECONDS. Dropped at startup without replicas.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with routers.request_pin(routers.PIN_COOKIE in request.COOKIES) as pin:
+            response = self.get_response(request)
+        return self.remember(pin, response)
+
+    async def __acall__(self, request):
+        with routers.request_pin(routers.PIN_COOKIE in request.COOKIES) as pin:
+            response = await self.get_response(request)
+        return self.remember(pin, response)
+
+    def remember(self, pin, response):
+        if pin.wrote:
+            response.set_cookie(
+                routers.PIN_COOKIE, '1', max_age=settings.DATABASE_PRIMARY_PIN_SECONDS,
+                secure=settings.SESSION_COOKIE_SECURE, httponly=True, samesite='Lax',
+            )
+        return response
+
+
+class SharedCacheMiddleware:
+    """
+    Goes above SessionMiddleware, so it sees the response's final cookies
+    and Vary header. Pages core.cdn tagged for sharing get public caching
+    headers unless a cookie was set on the way out; the same views'
+    per-visitor responses are marked private. Dropped at startup unless
+    CDN_CACHE_SECONDS is set.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.CDN_CACHE_SECONDS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.process_response(self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.process_response(await self.get_response(request))
+
+    def process_response(self, response):
+        tags = getattr(response, 'cdn_tags', None)
+        if tags is None:
+            return response
+        if tags and not response.cookies:
+            return cdn.share(response)
+        patch_cache_control(response, private=True)
+        return response
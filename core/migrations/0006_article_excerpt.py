@@ -0,0 +1,34 @@
+# Generated by Django 5.2.4 on 2026-10-18 10:15
+
+from itertools import islice
+
+from django.db import migrations, models
+from django.utils.text import Truncator
+
+BATCH_SIZE = 500
+
+
+def fill_excerpts(apps, schema_editor):
+    Article = apps.get_model('core', 'Article')
+    db = schema_editor.connection.alias
+    articles = Article.objects.using(db).order_by('pk').only('id', 'content').iterator(chunk_size=BATCH_SIZE)
+    while batch := list(islice(articles, BATCH_SIZE)):
+        for article in batch:
+            article.excerpt = Truncator(article.content or '').words(25)
+        Article.objects.using(db).bulk_update(batch, ['excerpt'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_article_created_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='excerpt',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.RunPython(fill_excerpts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.4 on 2026-10-18 10:26
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            "CREATE INDEX article_search_vector_idx ON core_article USING GIN (search_vector)"
+        )
+        schema_editor.execute(
+            "UPDATE core_article SET search_vector = "
+            "setweight(to_tsvector(COALESCE(title, '')), 'A') || "
+            "setweight(to_tsvector(COALESCE(content, '')), 'B')"
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE core_article_fts USING fts5(title, content)"
+        )
+        schema_editor.execute(
+            "INSERT INTO core_article_fts (rowid, title, content) "
+            "SELECT id, title, content FROM core_article"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS article_search_vector_idx")
+    elif vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS core_article_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
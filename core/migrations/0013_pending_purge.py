@@ -0,0 +1,20 @@
+# Generated by Django 5.2.4 on 2026-10-18 12:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_trending_article'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingPurge',
+            fields=[
+                ('tag', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('queued_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -1,13 +1,33 @@
-from django.db import models
+from django.db import IntegrityError, models, router, transaction
+from django.db.models import Count, Q
 from django.contrib.auth.models import User
-from django.utils.text import slugify
+from django.contrib.postgres.search import SearchVectorField
+from django.utils.html import linebreaks
+from django.utils.text import Truncator, slugify
 from django.utils import timezone
-import uuid
+import hashlib
+from .images import CATEGORY_WIDTHS, COVER_WIDTHS, discard_variants, refresh_variants
+
+class CategoryQuerySet(models.QuerySet):
+    def with_stats(self):
+        """
+        Annotate article_count, published_count and author_count, all from
+        one grouped query over the category/article join.
+        """
+        return self.annotate(
+            article_count=Count('article'),
+            published_count=Count('article', filter=Q(article__status='published')),
+            author_count=Count('article__author', distinct=True),
+        )
+
 
 class Category(models.Model):
     name = models.CharField(max_length=100, unique=True)
     slug = models.SlugField(max_length=150, unique=True, blank=True)
     image = models.ImageField(upload_to='category/', blank=True, null=True)
+    image_variants = models.JSONField(default=list, blank=True, editable=False)
+
+    objects = CategoryQuerySet.as_manager()
 
     class Meta:
         verbose_name_plural = "categories"
@@ -18,7 +38,45 @@ class Category(models.Model):
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
+        stale_variants = refresh_variants(self, 'image', 'image_variants', CATEGORY_WIDTHS)
         super().save(*args, **kwargs)
+        discard_variants(self, 'image', stale_variants)
+
+EXCERPT_WORDS = 25
+
+
+def make_excerpt(content):
+    return Truncator(content or '').words(EXCERPT_WORDS)
+
+
+def render_content(content):
+    """
+    HTML for an article body. Everything is escaped before paragraphs and
+    line breaks are added, so the result is safe to output as-is.
+    """
+    return linebreaks(content or '', autoescape=True)
+
+
+def content_hash(content):
+    return hashlib.sha256((content or '').encode()).hexdigest()
+
+
+class ArticleQuerySet(models.QuerySet):
+    def published(self):
+        return self.filter(status=Article.PUBLISHED)
+
+    def feed(self):
+        """
+        Everything an article card renders, in a fixed number of queries:
+        author and profile joined in, categories prefetched, and the full
+        content left behind in favor of the excerpt.
+        """
+        return (
+            self.select_related('author__profile')
+            .prefetch_related('categories')
+            .defer('content')
+        )
+
 
 class Article(models.Model):
     DRAFT = 'draft'
@@ -30,47 +88,197 @@ class Article(models.Model):
 
     title = models.CharField(max_length=200)
     slug = models.SlugField(max_length=250, unique=True, blank=True, null=True)
-    author = models.ForeignKey(User, on_delete=models.CASCADE)
+    # Indexed by article_author_pub_idx, which leads with author
+    author = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False)
     content = models.TextField()
+    excerpt = models.TextField(blank=True, editable=False)
+    content_html = models.TextField(blank=True, editable=False)
+    content_hash = models.CharField(max_length=64, blank=True, editable=False)
     published_at = models.DateTimeField(null=True, blank=True)
     categories = models.ManyToManyField(Category)
     cover_image = models.ImageField(upload_to='covers/', blank=True, null=True)
+    cover_variants = models.JSONField(default=list, blank=True, editable=False)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=DRAFT)
     created_at = models.DateTimeField(auto_now=True)
+    like_count = models.PositiveIntegerField(default=0, editable=False)
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+    # Only populated on PostgreSQL; see core.search
+    search_vector = SearchVectorField(null=True, editable=False)
     
+    # Maintained with in-database updates by core.signals; never written
+    # back from a possibly stale instance.
+    DB_MAINTAINED_FIELDS = ('like_count', 'comment_count', 'search_vector')
+    SLUG_RETRIES = 3
+    
+    objects = ArticleQuerySet.as_manager()
     
     class Meta:
         ordering = ['-published_at']
+        indexes = [
+            # Public feeds: status='published' ORDER BY published_at DESC, id DESC
+            models.Index(
+                fields=['-published_at', '-id'],
+                condition=Q(status='published'),
+                name='article_published_feed_idx',
+            ),
+            # Profile page: author=... ORDER BY published_at DESC
+            models.Index(fields=['author', '-published_at'], name='article_author_pub_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
     def save(self, *args, **kwargs):
-        if not self.slug or self.slug == '':
+        slug_generated = not self.slug
+        if slug_generated:
             self.slug = self.generate_unique_slug()
         
         if self.status == self.PUBLISHED and not self.published_at:
             self.published_at = timezone.now()
         
-        super().save(*args, **kwargs)
+        self.render()
+        stale_variants = refresh_variants(self, 'cover_image', 'cover_variants', COVER_WIDTHS)
+        
+        if (not self._state.adding and not kwargs.get('force_insert')
+                and kwargs.get('update_fields') is None):
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.attname for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.attname not in deferred
+                and field.attname not in self.DB_MAINTAINED_FIELDS
+            ]
+        
+        if not slug_generated:
+            super().save(*args, **kwargs)
+            discard_variants(self, 'cover_image', stale_variants)
+            return
+        
+        # Another writer may claim the same slug between allocation and
+        # insert; the unique constraint catches it and we allocate again.
+        for attempt in range(self.SLUG_RETRIES):
+            try:
+                with transaction.atomic():
+                    super().save(*args, **kwargs)
+                discard_variants(self, 'cover_image', stale_variants)
+                return
+            except IntegrityError:
+                last_attempt = attempt == self.SLUG_RETRIES - 1
+                if last_attempt or not Article.objects.filter(slug=self.slug).exists():
+                    raise
+                self.slug = self.generate_unique_slug()
+    
+    def render(self, force=False):
+        """
+        Refresh the stored HTML body and excerpt if the content changed since
+        they were last rendered. Returns True when anything was re-rendered.
+        """
+        digest = content_hash(self.content)
+        if digest == self.content_hash and not force:
+            return False
+        self.content_html = render_content(self.content)
+        self.excerpt = make_excerpt(self.content)
+        self.content_hash = digest
+        return True
     
     def generate_unique_slug(self):
         """Generate a unique slug even for empty titles"""
-        base_slug = slugify(self.title) if self.title else 'untitled'
-        if not base_slug:
-            base_slug = 'article'
-        
-        unique_slug = base_slug
-        suffix = 1
-        
-        while Article.objects.filter(slug=unique_slug).exists():
-            unique_slug = f"{base_slug}-{uuid.uuid4().hex[:6]}"
+        return allocate_slugs([self.title])[0]
+
+
+SLUG_BASE_MAX_LENGTH = 240
+
+
+def slug_base(title, fallback='article'):
+    base = slugify(title) if title else 'untitled'
+    return base[:SLUG_BASE_MAX_LENGTH].strip('-') or fallback
+
+
+def allocate_slugs(titles, queryset=None, preferred=None):
+    """
+    Unique slugs for a batch of titles, in order, from a single query.
+    Repeated titles get deterministic suffixes: ``weekly-update``,
+    ``weekly-update-2``, ``weekly-update-3``...
+
+    ``queryset`` holds the rows whose ``slug`` must not be reused (all
+    articles by default). ``preferred`` gives a slug per title, or None, to
+    keep when it is still free, as for re-imported exports.
+    """
+    queryset = Article.objects.all() if queryset is None else queryset
+    bases = [slug_base(title, queryset.model._meta.model_name) for title in titles]
+    if not bases:
+        return []
+    preferred = preferred or [None] * len(bases)
+
+    colliding = Q(slug__in={slug for slug in preferred if slug})
+    for base in set(bases):
+        colliding |= Q(slug=base) | Q(slug__startswith=f"{base}-")
+
+    # Each base and its suffixed copies, so a title ending in a number
+    # ("Route 66") is never mistaken for the 66th copy of "Route"
+    taken = set(queryset.filter(colliding).values_list('slug', flat=True))
+    # Preferred slugs go first, so a title allocated later cannot take one
+    slugs = [None] * len(bases)
+    for index, slug in enumerate(preferred):
+        if slug and slug not in taken:
+            taken.add(slug)
+            slugs[index] = slug
+
+    next_suffix = {}
+    for index, base in enumerate(bases):
+        if slugs[index]:
+            continue
+        suffix = next_suffix.get(base, 1)
+        slug = base
+        while slug in taken:
             suffix += 1
-        
-        return unique_slug
+            slug = f"{base}-{suffix}"
+        next_suffix[base] = suffix
+        taken.add(slug)
+        slugs[index] = slug
+    return slugs
+
+
+class CommentQuerySet(models.QuerySet):
+    def tree(self, max_depth=None):
+        """
+        Fetch the comments (with user and profile) in one query and assemble
+        them into threads in memory. Returns the top-level comments in order;
+        each comment carries ``thread_replies`` and ``depth``. Replies that
+        would nest deeper than ``max_depth`` are shown alongside their parent.
+        """
+        return self._thread(list(self._for_tree()), max_depth)
+
+    async def atree(self, max_depth=None):
+        return self._thread([comment async for comment in self._for_tree()], max_depth)
+
+    def _for_tree(self):
+        return self.select_related('user__profile').order_by('created_at', 'id')
+
+    @staticmethod
+    def _thread(comments, max_depth):
+        by_id = {comment.id: comment for comment in comments}
+        roots = []
+
+        for comment in comments:
+            comment.thread_replies = []
+            parent = by_id.get(comment.parent_id)
+            if parent is not None and max_depth is not None and parent.depth >= max_depth:
+                parent = parent.thread_parent
+            comment.thread_parent = parent
+            if parent is None:
+                comment.depth = 0
+                roots.append(comment)
+            else:
+                comment.depth = parent.depth + 1
+                parent.thread_replies.append(comment)
+
+        return roots
+
 
 class Comment(models.Model):
-    article = models.ForeignKey(Article, on_delete=models.CASCADE, related_name='comments')
+    # Indexed by comment_article_created_idx, which leads with article
+    article = models.ForeignKey(Article, on_delete=models.CASCADE, related_name='comments', db_index=False)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     body = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
@@ -78,14 +286,21 @@ class Comment(models.Model):
                               on_delete=models.CASCADE, 
                               related_name='replies')
 
+    objects = CommentQuerySet.as_manager()
+
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            # Comment.objects.tree(): article=... ORDER BY created_at, id
+            models.Index(fields=['article', 'created_at', 'id'], name='comment_article_created_idx'),
+        ]
 
     def __str__(self):
         return f"Comment by {self.user}"
 
 class Like(models.Model):
-    article = models.ForeignKey(Article, on_delete=models.CASCADE, related_name='likes')
+    # Indexed by the (article, user) unique constraint
+    article = models.ForeignKey(Article, on_delete=models.CASCADE, related_name='likes', db_index=False)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -95,3 +310,45 @@ class Like(models.Model):
     def __str__(self):
         return f"{self.user} likes {self.article}"
 
+    def remove(self):
+        """
+        Delete the like unless a concurrent unlike already did; True if this
+        call removed it. The row is locked first, so only one of two racing
+        requests collects it and post_delete decrements like_count once.
+        """
+        using = router.db_for_write(Like, instance=self)
+        with transaction.atomic(using=using):
+            locked = Like.objects.using(using).select_for_update().filter(pk=self.pk)
+            if not locked.exists():
+                return False
+            deleted, _ = Like.objects.using(using).filter(pk=self.pk).delete()
+        return deleted == 1
+
+
+
+class TrendingArticle(models.Model):
+    """
+    The current trending ranking, rebuilt wholesale by manage.py
+    compute_trending so reading it is a single scan of the rank index.
+    """
+    article = models.OneToOneField(
+        Article, on_delete=models.CASCADE, primary_key=True, related_name='trending',
+    )
+    rank = models.PositiveIntegerField(unique=True)
+    score = models.FloatField()
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['rank']
+
+    def __str__(self):
+        return f"#{self.rank} {self.article_id}"
+
+
+class PendingPurge(models.Model):
+    """A CDN tag waiting for manage.py run_cdn_purger; one row however often it changed"""
+    tag = models.CharField(max_length=50, primary_key=True)
+    queued_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.tag
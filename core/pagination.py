@@ -0,0 +1,129 @@
+import base64
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Q
+from django.http import Http404
+
+
+class CursorPage:
+    """One page of a keyset-paginated feed"""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+
+class CursorPaginator:
+    """
+    Keyset pagination over (published_at, id), newest first.
+
+    Pages are addressed by opaque cursors instead of offsets, so every page
+    costs one indexed range scan no matter how deep the reader goes.
+    """
+
+    def __init__(self, queryset, per_page=None):
+        self.queryset = queryset.order_by('-published_at', '-id')
+        self.per_page = per_page or settings.ARTICLE_FEED_PAGE_SIZE
+
+    @staticmethod
+    def encode_cursor(article):
+        raw = f"{article.published_at.isoformat()}|{article.pk}"
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    @staticmethod
+    def decode_cursor(cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            published_at, pk = base64.urlsafe_b64decode(padded).decode().split('|')
+            return datetime.fromisoformat(published_at), int(pk)
+        except (ValueError, UnicodeDecodeError):
+            raise Http404("Invalid page cursor")
+
+    def _window(self, after, before):
+        """The rows of the requested page plus one, to tell whether there are more"""
+        if before:
+            published_at, pk = self.decode_cursor(before)
+            return self.queryset.filter(
+                Q(published_at__gt=published_at) |
+                Q(published_at=published_at, id__gt=pk)
+            ).order_by('published_at', 'id')[:self.per_page + 1]
+        queryset = self.queryset
+        if after:
+            published_at, pk = self.decode_cursor(after)
+            queryset = queryset.filter(
+                Q(published_at__lt=published_at) |
+                Q(published_at=published_at, id__lt=pk)
+            )
+        return queryset[:self.per_page + 1]
+
+    def _page(self, rows, after, before):
+        if before:
+            has_previous = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+            has_next = True
+        else:
+            has_next = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            has_previous = bool(after)
+
+        if not rows:
+            return CursorPage([])
+
+        return CursorPage(
+            rows,
+            next_cursor=self.encode_cursor(rows[-1]) if has_next else None,
+            previous_cursor=self.encode_cursor(rows[0]) if has_previous else None,
+        )
+
+    def page(self, after=None, before=None):
+        """Return the page following ``after`` or preceding ``before``"""
+        return self._page(list(self._window(after, before)), after, before)
+
+    async def apage(self, after=None, before=None):
+        rows = [row async for row in self._window(after, before)]
+        return self._page(rows, after, before)
+
+
+def capped_count(queryset, cap=None):
+    """
+    Count rows up to ``cap`` so the badge never needs a full table scan.
+    Returns ``(count, is_capped)``.
+    """
+    cap = cap or settings.ARTICLE_FEED_COUNT_CAP
+    count = queryset.order_by()[:cap + 1].count()
+    return min(count, cap), count > cap
+
+
+async def acapped_count(queryset, cap=None):
+    cap = cap or settings.ARTICLE_FEED_COUNT_CAP
+    count = await queryset.order_by()[:cap + 1].acount()
+    return min(count, cap), count > cap
+
+
+def get_per_page(request):
+    """Page size from ``?per_page=``, clamped to the configured maximum"""
+    try:
+        per_page = int(request.GET.get('per_page', settings.ARTICLE_FEED_PAGE_SIZE))
+    except ValueError:
+        per_page = settings.ARTICLE_FEED_PAGE_SIZE
+    return max(1, min(per_page, settings.ARTICLE_FEED_MAX_PAGE_SIZE))
@@ -0,0 +1,17 @@
+"""
+Connection pool usage for monitoring.
+
+With DATABASE_POOL_ENABLED each PostgreSQL alias draws its connections from
+a psycopg 3 pool, one per process. ``pool_stats()`` reports the pools of the
+process it runs in; core.views.db_pool_stats serves it as JSON.
+"""
+from django.db import connections
+
+
+def pool_stats():
+    """``{alias: psycopg_pool stats}`` for every pooled connection"""
+    return {
+        alias: connections[alias].pool.get_stats()
+        for alias in connections
+        if connections[alias].settings_dict['OPTIONS'].get('pool')
+    }
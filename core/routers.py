@@ -0,0 +1,145 @@
+"""
+Read-replica routing.
+
+With DATABASE_REPLICA_URLS set, reads of core and accounts models go to a
+replica and every write goes to the primary ("default"). A visitor who
+writes is pinned to the primary for the rest of that request and, through
+the cookie PrimaryPinMiddleware sets, for DATABASE_PRIMARY_PIN_SECONDS
+after it, so they read their own article, comment or like rather than a
+lagging copy. Writes outside a request (management commands, workers) pin
+that thread's reads for DATABASE_PRIMARY_PIN_SECONDS after the last one.
+
+Open replica connections are re-checked every DATABASE_REPLICA_CHECK_SECONDS
+and after a query on them fails. A replica that cannot be connected to is
+skipped for DATABASE_REPLICA_RETRY_SECONDS; with none left, reads use the
+primary.
+"""
+import contextvars
+import logging
+import random
+import time
+import weakref
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+logger = logging.getLogger('core.routers')
+
+ROUTED_APPS = {'core', 'accounts'}
+PIN_COOKIE = 'primary_pin'
+
+
+class PrimaryPin:
+    def __init__(self, pinned=False, expires=False):
+        self.pinned = pinned
+        self.wrote = False
+        # Request pins end with the request; others run out after the last write
+        self.expires = expires
+        self.wrote_at = None
+
+
+_pin = contextvars.ContextVar('primary_pin', default=None)
+
+# alias -> time.monotonic() until which the replica is not tried again
+_down_until = {}
+
+# replica connection -> time.monotonic() of its last health check
+_checked_at = weakref.WeakKeyDictionary()
+
+
+@contextmanager
+def request_pin(pinned=False):
+    """Scope the read-your-writes state to one request"""
+    pin = PrimaryPin(pinned)
+    token = _pin.set(pin)
+    try:
+        yield pin
+    finally:
+        _pin.reset(token)
+
+
+def _pinned():
+    pin = _pin.get()
+    if pin is None or not (pin.pinned or pin.wrote):
+        return False
+    if pin.pinned or not pin.expires:
+        return True
+    return time.monotonic() - pin.wrote_at < settings.DATABASE_PRIMARY_PIN_SECONDS
+
+
+def _wrote():
+    pin = _pin.get()
+    if pin is None:
+        # Outside a request (management commands, shell): stay on the
+        # primary for as long as a visitor's pin cookie would
+        pin = PrimaryPin(expires=True)
+        _pin.set(pin)
+    pin.wrote = True
+    pin.wrote_at = time.monotonic()
+
+
+def _check(connection):
+    """Reconnect an open replica connection that stopped answering"""
+    if connection.connection is not None:
+        if connection.in_atomic_block:
+            # Mid-transaction; its own errors surface to the caller
+            return
+        due = _checked_at.get(connection, 0) + settings.DATABASE_REPLICA_CHECK_SECONDS
+        if not connection.errors_occurred and due > time.monotonic():
+            return
+        if connection.is_usable():
+            connection.errors_occurred = False
+        else:
+            connection.close()
+    connection.ensure_connection()
+    _checked_at[connection] = time.monotonic()
+
+
+def _usable(alias):
+    if _down_until.get(alias, 0) > time.monotonic():
+        return False
+    try:
+        _check(connections[alias])
+    except DatabaseError as exc:
+        logger.warning(
+            "Replica %s is unavailable, reading from the primary for %ss: %s",
+            alias, settings.DATABASE_REPLICA_RETRY_SECONDS, exc,
+        )
+        _down_until[alias] = time.monotonic() + settings.DATABASE_REPLICA_RETRY_SECONDS
+        return False
+    return True
+
+
+def healthy_replica():
+    """A random replica that accepts connections, or None"""
+    aliases = list(settings.DATABASE_REPLICAS)
+    random.shuffle(aliases)
+    return next((alias for alias in aliases if _usable(alias)), None)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label not in ROUTED_APPS or _pinned():
+            return DEFAULT_DB_ALIAS
+        return healthy_replica() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # Only writes whose rows are then read from replicas need the pin;
+        # session saves and last_login updates do not
+        if model._meta.app_label in ROUTED_APPS:
+            _wrote()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Replicas get their schema through replication
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
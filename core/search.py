@@ -0,0 +1,148 @@
+"""
+Full-text search over published articles.
+
+PostgreSQL keeps a weighted ``Article.search_vector`` (GIN indexed); SQLite
+keeps a parallel FTS5 table, ``core_article_fts``. Both are refreshed from
+core.signals when an article is saved or deleted, and any other database
+falls back to plain ``icontains`` matching.
+"""
+from django.contrib.postgres.search import (
+    SearchHeadline, SearchQuery, SearchRank, SearchVector,
+)
+from django.db import connection
+from django.db.models import F, Q
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+from .models import Article
+
+FTS_TABLE = 'core_article_fts'
+
+# Placeholders the database wraps matches in; swapped for <mark> only after
+# the snippet text itself has been escaped.
+MATCH_START = '\x02'
+MATCH_END = '\x03'
+SNIPPET_WORDS = 30
+
+
+def search_vector():
+    return SearchVector('title', weight='A') + SearchVector('content', weight='B')
+
+
+def index_article(article_id):
+    index_articles([article_id])
+
+
+def index_articles(article_ids):
+    """Refresh the search data of several articles in a fixed number of queries"""
+    article_ids = list(article_ids)
+    if not article_ids:
+        return
+    if connection.vendor == 'postgresql':
+        Article.objects.filter(pk__in=article_ids).update(search_vector=search_vector())
+    elif connection.vendor == 'sqlite':
+        placeholders = ', '.join(['%s'] * len(article_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})", article_ids)
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, title, content) "
+                f"SELECT id, title, content FROM core_article WHERE id IN ({placeholders})",
+                article_ids,
+            )
+
+
+def unindex_article(article_id):
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [article_id])
+
+
+def highlight(snippet):
+    return mark_safe(
+        escape(snippet).replace(MATCH_START, '<mark>').replace(MATCH_END, '</mark>')
+    )
+
+
+def _search_postgresql(query, offset, limit):
+    search_query = SearchQuery(query, search_type='websearch')
+    results = (
+        Article.objects.published().feed()
+        .filter(search_vector=search_query)
+        .annotate(
+            rank=SearchRank(F('search_vector'), search_query),
+            snippet=SearchHeadline(
+                'content', search_query,
+                start_sel=MATCH_START, stop_sel=MATCH_END,
+                max_words=SNIPPET_WORDS, min_words=SNIPPET_WORDS // 2,
+            ),
+        )
+        .order_by('-rank', '-published_at', '-id')
+    )
+    return list(results[offset:offset + limit])
+
+
+def _fts5_query(query):
+    # Quote every term so user input can never be read as FTS5 syntax
+    terms = [term.replace('"', '""') for term in query.split()]
+    return ' '.join(f'"{term}"' for term in terms)
+
+
+def _search_sqlite(query, offset, limit):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT fts.rowid, bm25({FTS_TABLE}, 10.0, 1.0) AS rank, "
+            f"snippet({FTS_TABLE}, 1, %s, %s, '…', %s) "
+            f"FROM {FTS_TABLE} AS fts "
+            f"JOIN core_article ON core_article.id = fts.rowid "
+            f"WHERE {FTS_TABLE} MATCH %s AND core_article.status = %s "
+            f"ORDER BY rank, core_article.published_at DESC LIMIT %s OFFSET %s",
+            [MATCH_START, MATCH_END, SNIPPET_WORDS, _fts5_query(query),
+             Article.PUBLISHED, limit, offset],
+        )
+        rows = cursor.fetchall()
+
+    articles = Article.objects.feed().in_bulk([row[0] for row in rows])
+    results = []
+    for article_id, rank, snippet in rows:
+        article = articles.get(article_id)
+        if article is None:
+            continue
+        # bm25() is lower-is-better; flip it so rank reads like PostgreSQL's
+        article.rank = -rank
+        article.snippet = snippet
+        results.append(article)
+    return results
+
+
+def _search_fallback(query, offset, limit):
+    matches = Q()
+    for term in query.split():
+        matches &= Q(title__icontains=term) | Q(content__icontains=term)
+    results = list(
+        Article.objects.published().feed().filter(matches)
+        .order_by('-published_at', '-id')[offset:offset + limit]
+    )
+    for article in results:
+        article.rank = None
+        article.snippet = article.excerpt
+    return results
+
+
+def search_articles(query, page=1, per_page=10):
+    """
+    One page of published articles matching ``query``, best match first.
+    Each article carries ``rank`` and a ``highlighted`` snippet with the
+    matches wrapped in <mark>. Returns ``(results, has_next)``.
+    """
+    query = query.strip()
+    if not query:
+        return [], False
+
+    search = {
+        'postgresql': _search_postgresql,
+        'sqlite': _search_sqlite,
+    }.get(connection.vendor, _search_fallback)
+
+    results = search(query, (page - 1) * per_page, per_page + 1)
+    for article in results:
+        article.highlighted = highlight(article.snippet)
+    return results[:per_page], len(results) > per_page
@@ -0,0 +1,77 @@
+# core/signals.py
+from django.db.models import F, QuerySet
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from . import cache, search
+from .models import Article, Category, Comment, Like
+
+
+def _bump(article_id, field, delta):
+    Article.objects.filter(pk=article_id).update(**{field: F(field) + delta})
+
+
+def _article_is_going_away(origin):
+    """True when the delete was started on the article itself"""
+    if isinstance(origin, Article):
+        return True
+    return isinstance(origin, QuerySet) and origin.model is Article
+
+
+@receiver(post_save, sender=Like)
+def like_created(sender, instance, created, **kwargs):
+    if created:
+        _bump(instance.article_id, 'like_count', 1)
+
+
+@receiver(post_delete, sender=Like)
+def like_deleted(sender, instance, origin=None, **kwargs):
+    if not _article_is_going_away(origin):
+        _bump(instance.article_id, 'like_count', -1)
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, **kwargs):
+    if created:
+        _bump(instance.article_id, 'comment_count', 1)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, origin=None, **kwargs):
+    """Also runs once per reply removed by a cascading parent delete"""
+    if not _article_is_going_away(origin):
+        _bump(instance.article_id, 'comment_count', -1)
+
+
+@receiver(post_save, sender=Article)
+@receiver(post_delete, sender=Article)
+@receiver(m2m_changed, sender=Article.categories.through)
+def article_changed(sender, **kwargs):
+    cache.bump(cache.ARTICLES)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, **kwargs):
+    cache.bump(cache.CATEGORIES)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comments_changed(sender, **kwargs):
+    cache.bump(cache.COMMENTS)
+
+
+@receiver(post_save, sender=Like)
+@receiver(post_delete, sender=Like)
+def likes_changed(sender, **kwargs):
+    cache.bump(cache.LIKES)
+
+
+@receiver(post_save, sender=Article)
+def article_saved_reindex(sender, instance, **kwargs):
+    search.index_article(instance.pk)
+
+
+@receiver(post_delete, sender=Article)
+def article_deleted_unindex(sender, instance, **kwargs):
+    search.unindex_article(instance.pk)
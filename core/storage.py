@@ -0,0 +1,93 @@
+"""
+Memoized ``url()`` for the default storage.
+
+Cloudinary builds every URL in Python (signing, transformations), and one
+page asks for the same avatar many times over. Wrapping the configured
+backend caches URLs per file name in a bounded per-process LRU, backed by
+the shared Django cache so other workers benefit too.
+
+Uploads get unique names, so a cached URL only goes stale when a name is
+reused; ``save()`` and ``delete()`` forget the name for that case, and the
+per-process entries also expire after ``lru_ttl`` seconds.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+
+URL_KEY_PREFIX = 'storage-url:'
+
+
+class CachedURLMixin:
+    lru_size = 2048
+    lru_ttl = 300
+    shared_timeout = 24 * 60 * 60
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._lru = OrderedDict()
+        self._lru_lock = threading.Lock()
+
+    @staticmethod
+    def _shared_key(name):
+        return URL_KEY_PREFIX + hashlib.md5(name.encode()).hexdigest()
+
+    def url(self, name):
+        if not name:
+            return super().url(name)
+
+        now = time.monotonic()
+        with self._lru_lock:
+            entry = self._lru.get(name)
+            if entry is not None and entry[1] > now:
+                self._lru.move_to_end(name)
+                return entry[0]
+
+        url = cache.get(self._shared_key(name))
+        if url is None:
+            url = super().url(name)
+            cache.set(self._shared_key(name), url, self.shared_timeout)
+
+        with self._lru_lock:
+            self._lru[name] = (url, now + self.lru_ttl)
+            self._lru.move_to_end(name)
+            while len(self._lru) > self.lru_size:
+                self._lru.popitem(last=False)
+        return url
+
+    def forget_url(self, name):
+        with self._lru_lock:
+            self._lru.pop(name, None)
+        cache.delete(self._shared_key(name))
+
+    def save(self, name, content, max_length=None):
+        name = super().save(name, content, max_length=max_length)
+        self.forget_url(name)
+        return name
+
+    def delete(self, name):
+        super().delete(name)
+        self.forget_url(name)
+
+
+@lru_cache(maxsize=None)
+def _cached_url_class(backend):
+    backend_class = import_string(backend)
+    return type(f"CachedURL{backend_class.__name__}", (CachedURLMixin, backend_class), {})
+
+
+def cached_url_storage(backend, lru_size=None, lru_ttl=None, **options):
+    """
+    Storage factory for ``STORAGES``: builds ``backend`` with ``url()``
+    memoized. The backend is only imported when the storage is first used.
+    """
+    storage = _cached_url_class(backend)(**options)
+    if lru_size is not None:
+        storage.lru_size = lru_size
+    if lru_ttl is not None:
+        storage.lru_ttl = lru_ttl
+    return storage
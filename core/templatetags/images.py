@@ -0,0 +1,41 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+
+register = template.Library()
+
+
+def _srcset(variants, fmt, storage):
+    return ', '.join(
+        f"{storage.url(variant['name'])} {variant['width']}w"
+        for variant in variants if variant['format'] == fmt
+    )
+
+
+@register.simple_tag
+def responsive_img(field_file, variants, sizes='100vw', alt='', **attrs):
+    """
+    ``<picture>`` with a WebP ``srcset`` and a fallback ``<img srcset>`` built
+    from the stored variants; a plain ``<img>`` for images without any.
+
+        {% responsive_img article.cover_image article.cover_variants sizes="400px" alt=article.title loading="lazy" %}
+    """
+    if not field_file:
+        return ''
+
+    extra = format_html_join('', ' {}="{}"', sorted(attrs.items()))
+    if not variants:
+        return format_html('<img src="{}" alt="{}"{}>', field_file.url, alt, extra)
+
+    storage = field_file.storage
+    webp_srcset = _srcset(variants, 'webp', storage)
+    fallback = [variant for variant in variants if variant['format'] != 'webp']
+    fallback_srcset = _srcset(fallback, fallback[0]['format'], storage) if fallback else ''
+    src = storage.url(fallback[-1]['name']) if fallback else field_file.url
+
+    return format_html(
+        '<picture>'
+        '<source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" alt="{}"{}>'
+        '</picture>',
+        webp_srcset, sizes, src, fallback_srcset, sizes, alt, extra,
+    )
@@ -1,3 +1,1368 @@
-from django.test import TestCase
+import contextvars
+import json
+import math
+import os
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from html.parser import HTMLParser
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, connections, transaction
+from django.db.backends.sqlite3.base import DatabaseWrapper as SQLiteDatabaseWrapper
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
+from django.utils.http import http_date
+from PIL import Image
+
+from . import async_views, benchmark, routers, trending
+from .cache import ARTICLES, NAMESPACES, TRENDING, bump, get_versions
+from .models import Article, Category, Comment, Like, PendingPurge, TrendingArticle, allocate_slugs
+from .storage import cached_url_storage
+
+
+class BlogTestCase(TestCase):
+    """Start every test with an empty cache so cached pages never leak between tests"""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+
+class FeedPaginationTests(BlogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('writer', password='pass12345')
+        cls.category = Category.objects.create(name='Travel')
+        for i in range(25):
+            article = Article.objects.create(
+                title=f'Article {i}',
+                content='Some content',
+                author=cls.author,
+                status=Article.PUBLISHED,
+            )
+            article.categories.add(cls.category)
+
+    def titles(self, response):
+        return [article.title for article in response.context['articles']]
+
+    def test_first_page_is_newest(self):
+        response = self.client.get(reverse('home'), {'per_page': 10})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.titles(response)[0], 'Article 24')
+        self.assertEqual(len(response.context['articles']), 10)
+        self.assertFalse(response.context['page'].has_previous)
+        self.assertTrue(response.context['page'].has_next)
+
+    def test_next_and_previous_cursors_round_trip(self):
+        first = self.client.get(reverse('home'), {'per_page': 10})
+        second = self.client.get(reverse('home'), {
+            'per_page': 10,
+            'after': first.context['page'].next_cursor,
+        })
+        self.assertEqual(self.titles(second)[0], 'Article 14')
+
+        back = self.client.get(reverse('home'), {
+            'per_page': 10,
+            'before': second.context['page'].previous_cursor,
+        })
+        self.assertEqual(self.titles(back), self.titles(first))
+        self.assertFalse(back.context['page'].has_previous)
+
+    def test_last_page_has_no_next_cursor(self):
+        response = self.client.get(
+            reverse('category_articles', args=[self.category.slug]),
+            {'per_page': 25},
+        )
+        self.assertEqual(len(response.context['articles']), 25)
+        self.assertFalse(response.context['page'].has_next)
+
+    def test_count_is_capped(self):
+        with self.settings(ARTICLE_FEED_COUNT_CAP=20):
+            response = self.client.get(reverse('home'))
+        self.assertEqual(response.context['articles_count'], 20)
+        self.assertTrue(response.context['articles_count_capped'])
+
+    def test_invalid_cursor_is_404(self):
+        response = self.client.get(reverse('home'), {'after': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+
+class FeedQueryCountTests(BlogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Food')
+        for i in range(12):
+            author = User.objects.create_user(f'author{i}', password='pass12345')
+            article = Article.objects.create(
+                title=f'Recipe {i}',
+                content='word ' * 100,
+                author=author,
+                status=Article.PUBLISHED,
+            )
+            article.categories.add(category)
+            Like.objects.create(article=article, user=author)
+
+    def queries_for(self, per_page):
+        cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('home'), {'per_page': per_page})
+        self.assertEqual(len(response.context['articles']), per_page)
+        return len(ctx)
+
+    def test_query_count_independent_of_page_size(self):
+        self.assertEqual(self.queries_for(2), self.queries_for(12))
+
+    def test_feed_defers_content(self):
+        article = Article.objects.feed().first()
+        self.assertIn('content', article.get_deferred_fields())
+        self.assertEqual(article.like_count, 1)
+        self.assertEqual(len(article.excerpt.split()), 25)
+
+
+class ArticleCounterTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.author = User.objects.create_user('author', password='pass12345')
+        self.reader = User.objects.create_user('reader', password='pass12345')
+        self.article = Article.objects.create(
+            title='Counted', content='Body', author=self.author, status=Article.PUBLISHED,
+        )
+        self.client.force_login(self.reader)
+
+    def test_like_toggle_updates_count(self):
+        url = reverse('toggle_like', args=[self.article.slug])
+        self.client.post(url)
+        self.article.refresh_from_db()
+        self.assertEqual(self.article.like_count, 1)
+        self.client.post(url)
+        self.article.refresh_from_db()
+        self.assertEqual(self.article.like_count, 0)
+
+    def test_comment_and_cascading_reply_delete(self):
+        self.client.post(reverse('add_comment', args=[self.article.slug]), {'body': 'First'})
+        parent = Comment.objects.get()
+        self.client.post(reverse('add_comment', args=[self.article.slug]), {
+            'body': 'Reply', 'parent_id': parent.id,
+        })
+        self.article.refresh_from_db()
+        self.assertEqual(self.article.comment_count, 2)
+
+        self.client.post(reverse('delete_comment', args=[parent.id]))
+        self.article.refresh_from_db()
+        self.assertEqual(self.article.comment_count, 0)
+
+    def test_stale_instance_save_keeps_counts(self):
+        stale = Article.objects.get(pk=self.article.pk)
+        Like.objects.create(article=self.article, user=self.reader)
+        stale.title = 'Renamed'
+        stale.save()
+        self.article.refresh_from_db()
+        self.assertEqual(self.article.like_count, 1)
+
+    def test_recount_command_repairs_drift(self):
+        Like.objects.create(article=self.article, user=self.reader)
+        Article.objects.filter(pk=self.article.pk).update(like_count=42, comment_count=7)
+        call_command('recount_article_stats', stdout=StringIO())
+        self.article.refresh_from_db()
+        self.assertEqual((self.article.like_count, self.article.comment_count), (1, 0))
+
+    def test_detail_page_does_not_count_likes(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse('article_detail', args=[self.article.slug]))
+        self.assertFalse(any('COUNT' in query['sql'] for query in ctx.captured_queries))
+
+
+class ToggleLikeTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.reader = User.objects.create_user('liker', password='pass12345')
+        self.article = Article.objects.create(
+            title='Likeable', content='Body', author=self.reader, status=Article.PUBLISHED,
+        )
+        self.url = reverse('toggle_like', args=[self.article.slug])
+        self.client.force_login(self.reader)
+
+    def test_json_mode(self):
+        response = self.client.post(self.url, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.json(), {'liked': True, 'count': 1})
+        response = self.client.post(self.url, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.json(), {'liked': False, 'count': 0})
+
+    def test_html_mode_redirects(self):
+        response = self.client.post(self.url, HTTP_ACCEPT='text/html,*/*;q=0.8')
+        self.assertRedirects(response, reverse('article_detail', args=[self.article.slug]))
+        self.assertTrue(Like.objects.filter(article=self.article, user=self.reader).exists())
+
+    def test_concurrent_unlikes_decrement_once(self):
+        other = User.objects.create_user('other', password='pass12345')
+        Like.objects.create(article=self.article, user=other)
+        mine = Like.objects.create(article=self.article, user=self.reader)
+        stale = Like.objects.get(pk=mine.pk)  # as a second request loaded it
+
+        self.assertTrue(mine.remove())
+        self.assertFalse(stale.remove())
+        self.article.refresh_from_db()
+        self.assertEqual(self.article.like_count, 1)
+
+    def test_unknown_article_is_404(self):
+        response = self.client.post(reverse('toggle_like', args=['missing']))
+        self.assertEqual(response.status_code, 404)
+
+
+class CommentTreeTests(BlogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('commenter', password='pass12345')
+        cls.article = Article.objects.create(
+            title='Discussed', content='Body', author=cls.user, status=Article.PUBLISHED,
+        )
+
+    def comment(self, body, parent=None):
+        return Comment.objects.create(article=self.article, user=self.user, body=body, parent=parent)
+
+    def test_tree_is_assembled_from_one_query(self):
+        first = self.comment('first')
+        reply = self.comment('reply', parent=first)
+        self.comment('nested', parent=reply)
+        self.comment('second')
+
+        with self.assertNumQueries(1):
+            roots = self.article.comments.tree()
+            self.assertEqual([c.body for c in roots], ['first', 'second'])
+            self.assertEqual(roots[0].thread_replies[0].thread_replies[0].body, 'nested')
+            self.assertEqual(roots[0].thread_replies[0].user.profile.pk, self.user.profile.pk)
+
+    def test_max_depth_flattens_deep_replies(self):
+        parent = self.comment('root')
+        for i in range(4):
+            parent = self.comment(f'level {i + 1}', parent=parent)
+
+        roots = self.article.comments.tree(max_depth=2)
+        level_one = roots[0].thread_replies[0]
+        self.assertEqual(
+            [c.body for c in level_one.thread_replies],
+            ['level 2', 'level 3', 'level 4'],
+        )
+        self.assertEqual({c.depth for c in level_one.thread_replies}, {2})
+
+    def test_detail_query_count_independent_of_comment_count(self):
+        url = reverse('article_detail', args=[self.article.slug])
+        self.client.get(url)  # caches the article body, which comments leave alone
+        self.comment('only one')
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(url)
+        for i in range(10):
+            self.comment(f'reply {i}', parent=self.comment(f'thread {i}'))
+        with CaptureQueriesContext(connection) as many:
+            self.client.get(url)
+        self.assertEqual(len(few), len(many))
+
+    def test_top_level_threads_are_paginated(self):
+        for i in range(3):
+            self.comment(f'thread {i}')
+        with self.settings(COMMENT_THREADS_PER_PAGE=2):
+            response = self.client.get(
+                reverse('article_detail', args=[self.article.slug]), {'comments_page': 2},
+            )
+        self.assertEqual([c.body for c in response.context['comments']], ['thread 2'])
+
+
+class TagBalance(HTMLParser):
+    VOID = {'img', 'source', 'br', 'hr', 'input', 'meta', 'link'}
+
+    def __init__(self):
+        super().__init__()
+        self.open = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag not in self.VOID:
+            self.open.append(tag)
+
+    def handle_endtag(self, tag):
+        assert self.open and self.open.pop() == tag, f'unbalanced </{tag}>'
+
+
+class PageCacheTests(BlogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('cached', password='pass12345')
+        cls.article = Article.objects.create(
+            title='Cached', content='Body', author=cls.author, status=Article.PUBLISHED,
+        )
+
+    def test_anonymous_page_served_from_cache(self):
+        url = reverse('article_detail', args=[self.article.slug])
+        first = self.client.get(url)
+        with self.assertNumQueries(0):
+            second = self.client.get(url)
+        self.assertEqual(first.content, second.content)
+
+    def test_signal_bumps_invalidate_cached_pages(self):
+        self.client.get(reverse('home'))
+        Article.objects.create(
+            title='Fresh off the press', content='Body', author=self.author,
+            status=Article.PUBLISHED,
+        )
+        self.assertContains(self.client.get(reverse('home')), 'Fresh off the press')
+
+        self.client.get(reverse('article_detail', args=[self.article.slug]))
+        Comment.objects.create(article=self.article, user=self.author, body='Late comment')
+        self.assertContains(
+            self.client.get(reverse('article_detail', args=[self.article.slug])),
+            'Late comment',
+        )
+
+    def test_likes_keep_fragments_but_update_counts(self):
+        self.client.force_login(self.author)
+        reader = User.objects.create_user('reader', password='pass12345')
+        self.client.get(reverse('home'))
+        self.client.get(reverse('article_detail', args=[self.article.slug]))
+
+        # Changed behind the signals' back: only a reused fragment still shows the old title
+        Article.objects.filter(pk=self.article.pk).update(title='Sneaky', content_html='<p>Sneaky</p>')
+        Like.objects.create(article=self.article, user=reader)
+        Comment.objects.create(article=self.article, user=reader, body='Nice')
+
+        home = self.client.get(reverse('home'))
+        self.assertContains(home, '>Cached</a>')
+        self.assertRegex(home.content.decode(), r'Likes ❤️</span>\s*1\s*<')
+        self.assertRegex(home.content.decode(), r'💬</span>\s*1\s*<')
+        detail = self.client.get(reverse('article_detail', args=[self.article.slug]))
+        self.assertContains(detail, '<h1 class="article-title">Cached</h1>')
+        self.assertNotContains(detail, '<p>Sneaky</p>')
+        self.assertContains(detail, 'Comments (1)')
+
+        self.article.refresh_from_db()
+        self.article.save()
+        self.assertContains(self.client.get(reverse('home')), '>Sneaky</a>')
+
+    def test_card_fragments_hold_whole_elements(self):
+        response = self.client.get(reverse('home'))
+        key = make_template_fragment_key(
+            'article_card', [self.article.pk, response.context['article_version']],
+        )
+        parser = TagBalance()
+        parser.feed(cache.get(key))
+        self.assertEqual(parser.open, [])
+        self.assertNotIn('article-stats', cache.get(key))
+
+    def test_logged_in_users_get_live_like_state(self):
+        url = reverse('article_detail', args=[self.article.slug])
+        self.client.get(url)
+        self.client.force_login(self.author)
+        Like.objects.create(article=self.article, user=self.author)
+        response = self.client.get(url)
+        self.assertTrue(response.context['liked'])
+        self.assertContains(response, 'Edit')
+
+
+class SlugAllocationTests(BlogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('slugger', password='pass12345')
+
+    def create(self, title):
+        return Article.objects.create(title=title, content='Body', author=self.author)
+
+    def test_repeated_titles_get_sequential_suffixes(self):
+        slugs = [self.create('Weekly update').slug for _ in range(3)]
+        self.assertEqual(slugs, ['weekly-update', 'weekly-update-2', 'weekly-update-3'])
+
+    def test_empty_title_falls_back(self):
+        self.assertEqual(self.create('').slug, 'untitled')
+        self.assertEqual(self.create('???').slug, 'article')
+
+    def test_similar_prefixes_do_not_collide(self):
+        self.create('Weekly update')
+        self.create('Weekly update notes')
+        self.assertEqual(self.create('Weekly update').slug, 'weekly-update-2')
+
+    def test_titles_ending_in_numbers_are_not_suffixes(self):
+        self.create('Route 66')
+        self.assertEqual(self.create('Route').slug, 'route')
+        self.assertEqual(self.create('Route').slug, 'route-2')
+        self.assertEqual(allocate_slugs(['Route 66', 'Route 3', 'Route', 'Route']),
+                         ['route-66-2', 'route-3', 'route-4', 'route-5'])
+        self.create('Route 66')
+        self.assertEqual(self.create('Route 66').slug, 'route-66-3')
+
+    def test_batch_allocation_uses_one_query(self):
+        self.create('Untitled draft')
+        with self.assertNumQueries(1) as queries:
+            slugs = allocate_slugs(['Untitled draft', 'Untitled draft', 'Fresh'])
+        # Only the base and its suffixed copies, not every slug sharing a prefix
+        self.assertNotIn("'fresh%'", queries.captured_queries[0]['sql'])
+        self.assertEqual(slugs, ['untitled-draft-2', 'untitled-draft-3', 'fresh'])
+
+    def test_slug_collision_on_insert_is_retried(self):
+        first = self.create('Race')
+        racer = Article(title='Race', content='Body', author=self.author)
+        racer.generate_unique_slug = lambda: first.slug if racer.slug is None else 'race-2'
+        racer.save()
+        self.assertEqual(racer.slug, 'race-2')
+
+
+class QueryIndexTests(BlogTestCase):
+    """The public query shapes should be answered from the indexes in Meta.indexes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('indexed', password='pass12345')
+        cls.article = Article.objects.create(
+            title='Indexed', content='Body', author=cls.author, status=Article.PUBLISHED,
+        )
+        Article.objects.create(title='Draft', content='Body', author=cls.author)
+        Comment.objects.create(article=cls.article, user=cls.author, body='Hi')
+
+    def assertUsesIndex(self, queryset, index_name):
+        if connection.vendor == 'postgresql':
+            # Tiny test tables would otherwise always get a sequential scan
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        plan = queryset.explain()
+        self.assertIn(index_name, plan)
+
+    def test_published_feed(self):
+        queryset = Article.objects.published().feed().order_by('-published_at', '-id')[:12]
+        self.assertUsesIndex(queryset, 'article_published_feed_idx')
+
+    def test_author_articles(self):
+        queryset = Article.objects.filter(author=self.author).order_by('-published_at')
+        self.assertUsesIndex(queryset, 'article_author_pub_idx')
+
+    def test_comment_tree(self):
+        queryset = Comment.objects.filter(article=self.article).order_by('created_at', 'id')
+        self.assertUsesIndex(queryset, 'comment_article_created_idx')
+
+    def test_foreign_keys_are_not_indexed_twice(self):
+        with connection.cursor() as cursor:
+            for model, column in [(Article, 'author_id'), (Comment, 'article_id'), (Like, 'article_id')]:
+                indexes = connection.introspection.get_constraints(cursor, model._meta.db_table).values()
+                leading = [index for index in indexes if index['index'] and index['columns'][0] == column]
+                self.assertEqual(len(leading), 1, f"{model.__name__}.{column}")
+
+
+class SearchTests(BlogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('searcher', password='pass12345')
+        cls.in_title = Article.objects.create(
+            title='Sourdough basics', content='Flour, water and patience.',
+            author=cls.author, status=Article.PUBLISHED,
+        )
+        cls.in_content = Article.objects.create(
+            title='Weekend baking', content='My sourdough <b>starter</b> finally rose.',
+            author=cls.author, status=Article.PUBLISHED,
+        )
+        Article.objects.create(
+            title='Sourdough draft', content='Unpublished', author=cls.author,
+        )
+
+    def search(self, query, **params):
+        return self.client.get(reverse('search'), {'q': query, **params})
+
+    def test_ranks_title_matches_first_and_skips_drafts(self):
+        response = self.search('sourdough')
+        self.assertEqual(
+            [article.pk for article in response.context['results']],
+            [self.in_title.pk, self.in_content.pk],
+        )
+
+    def test_snippet_is_highlighted_and_escaped(self):
+        response = self.search('starter')
+        snippet = response.context['results'][0].highlighted
+        self.assertIn('<mark>starter</mark>', snippet)
+        self.assertIn('&lt;b&gt;', snippet)
+
+    def test_index_follows_edits_and_deletes(self):
+        self.in_content.content = 'Now about rye instead.'
+        self.in_content.save()
+        self.assertEqual(len(self.search('rye').context['results']), 1)
+        self.assertEqual(len(self.search('starter').context['results']), 0)
+
+        self.in_content.delete()
+        self.assertEqual(len(self.search('rye').context['results']), 0)
+
+    def test_pagination(self):
+        with self.settings(SEARCH_RESULTS_PER_PAGE=1):
+            first = self.search('sourdough')
+            second = self.search('sourdough', page=2)
+        self.assertTrue(first.context['has_next'])
+        self.assertEqual(second.context['results'][0].pk, self.in_content.pk)
+        self.assertFalse(second.context['has_next'])
+
+    def test_fts_syntax_in_query_is_harmless(self):
+        self.assertEqual(self.search('"sour* OR (').status_code, 200)
+
+
+class RenderedContentTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.author = User.objects.create_user('renderer', password='pass12345')
+        self.article = Article.objects.create(
+            title='Rendered', content='First <script>x</script>\n\nSecond',
+            author=self.author, status=Article.PUBLISHED,
+        )
+
+    def test_html_is_rendered_and_escaped_on_save(self):
+        self.assertEqual(
+            self.article.content_html,
+            '<p>First &lt;script&gt;x&lt;/script&gt;</p>\n\n<p>Second</p>',
+        )
+
+    def test_unchanged_content_is_not_rendered_again(self):
+        self.article.title = 'Renamed'
+        self.assertFalse(self.article.render())
+        self.article.content = 'Changed'
+        self.assertTrue(self.article.render())
+        self.assertEqual(self.article.content_html, '<p>Changed</p>')
+
+    def test_detail_page_does_not_load_raw_content(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('article_detail', args=[self.article.slug]))
+        self.assertContains(response, '<p>Second</p>')
+        article_query = next(q['sql'] for q in ctx.captured_queries if 'core_article' in q['sql'])
+        self.assertNotIn('"core_article"."content",', article_query)
+
+    def test_backfill_command(self):
+        Article.objects.update(content_html='', excerpt='', content_hash='')
+        version = get_versions([ARTICLES])
+        out = StringIO()
+        call_command('render_articles', '--batch-size', '1', stdout=out)
+        self.assertIn('Rendered 1 article(s).', out.getvalue())
+        self.assertNotEqual(get_versions([ARTICLES]), version)
+        self.article.refresh_from_db()
+        self.assertIn('<p>Second</p>', self.article.content_html)
+        self.assertTrue(self.article.excerpt)
+
+
+def image_upload(name='cover.jpg', size=(2000, 1000), mode='RGB', fmt='JPEG'):
+    buffer = BytesIO()
+    Image.new(mode, size, 'red').save(buffer, fmt)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type=f'image/{fmt.lower()}')
+
+
+class ImageVariantTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        storage_settings = override_settings(
+            MEDIA_ROOT=media_root,
+            STORAGES={
+                'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+                'staticfiles': {'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage'},
+            },
+        )
+        storage_settings.enable()
+        self.addCleanup(storage_settings.disable)
+        self.author = User.objects.create_user('photographer', password='pass12345')
+
+    def test_cover_upload_generates_resized_and_webp_variants(self):
+        article = Article.objects.create(
+            title='Pictured', content='Body', author=self.author,
+            status=Article.PUBLISHED, cover_image=image_upload(),
+        )
+        widths = sorted({v['width'] for v in article.cover_variants})
+        self.assertEqual(widths, [480, 960, 1440])
+        self.assertEqual({v['format'] for v in article.cover_variants}, {'webp', 'jpeg'})
+        for variant in article.cover_variants:
+            self.assertTrue(default_storage.exists(variant['name']))
+        with default_storage.open(article.cover_variants[0]['name']) as f:
+            self.assertEqual(Image.open(f).size, (480, 240))
+
+    def test_unreadable_upload_is_kept_without_variants(self):
+        self.client.force_login(self.author)
+        response = self.client.post(reverse('create_article'), {
+            'title': 'Broken cover', 'content': 'Body', 'status': Article.PUBLISHED,
+            'cover_image': SimpleUploadedFile('cover.jpg', b'not an image', content_type='image/jpeg'),
+        })
+        article = Article.objects.get()
+        self.assertRedirects(response, reverse('article_detail', args=[article.slug]))
+        self.assertTrue(article.cover_image)
+        self.assertEqual(article.cover_variants, [])
+
+        truncated = image_upload()
+        truncated.file.truncate(200)
+        article.cover_image = truncated
+        with self.assertLogs('core.images', 'WARNING'):
+            article.save()
+        self.assertEqual(article.cover_variants, [])
+
+    def test_small_images_are_not_upscaled(self):
+        article = Article.objects.create(
+            title='Tiny', content='Body', author=self.author,
+            cover_image=image_upload(size=(600, 300)),
+        )
+        self.assertEqual(sorted({v['width'] for v in article.cover_variants}), [480, 600])
+
+    def test_transparent_avatar_is_square_png(self):
+        profile = self.author.profile
+        profile.avatar = image_upload('me.png', size=(300, 200), mode='RGBA', fmt='PNG')
+        profile.save()
+        self.assertEqual({v['format'] for v in profile.avatar_variants}, {'webp', 'png'})
+        with default_storage.open(profile.avatar_variants[-1]['name']) as f:
+            self.assertEqual(Image.open(f).size, (128, 128))
+
+    def test_replacing_or_clearing_drops_old_variants(self):
+        article = Article.objects.create(
+            title='Swapped', content='Body', author=self.author, cover_image=image_upload(),
+        )
+        old_names = [v['name'] for v in article.cover_variants]
+        article.cover_image = None
+        with self.captureOnCommitCallbacks(execute=True):
+            article.save()
+        self.assertEqual(article.cover_variants, [])
+        self.assertFalse(any(default_storage.exists(name) for name in old_names))
+
+    def test_rolled_back_save_keeps_old_variants(self):
+        article = Article.objects.create(
+            title='Kept', content='Body', author=self.author, cover_image=image_upload(),
+        )
+        old_names = [v['name'] for v in article.cover_variants]
+        article.cover_image = image_upload('new.jpg')
+        with self.captureOnCommitCallbacks(execute=True), self.assertRaises(ValueError):
+            with transaction.atomic():
+                article.save()
+                raise ValueError("rolled back")
+        self.assertTrue(all(default_storage.exists(name) for name in old_names))
+
+    def test_card_renders_srcset(self):
+        article = Article.objects.create(
+            title='Card', content='Body', author=self.author,
+            status=Article.PUBLISHED, cover_image=image_upload(),
+        )
+        response = self.client.get(reverse('home'))
+        self.assertContains(response, '<source type="image/webp" srcset="')
+        self.assertContains(response, f"{default_storage.url(article.cover_variants[0]['name'])} 480w")
+
+
+class CountingStorage(FileSystemStorage):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.url_calls = 0
+
+    def url(self, name):
+        self.url_calls += 1
+        return super().url(name)
+
+
+class CachedURLStorageTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location)
+        self.storage = cached_url_storage('core.tests.CountingStorage', location=location)
+
+    def test_repeated_urls_hit_backend_once(self):
+        urls = {self.storage.url('avatars/me.png') for _ in range(5)}
+        self.assertEqual(urls, {'/media/avatars/me.png'})
+        self.assertEqual(self.storage.url_calls, 1)
+
+    def test_shared_cache_serves_other_processes(self):
+        self.storage.url('covers/a.jpg')
+        other = cached_url_storage('core.tests.CountingStorage', location=self.storage.location)
+        other.url('covers/a.jpg')
+        self.assertEqual(other.url_calls, 0)
+
+    def test_lru_is_bounded(self):
+        self.storage.lru_size = 2
+        for name in ('a.jpg', 'b.jpg', 'c.jpg'):
+            self.storage.url(name)
+        self.assertEqual(list(self.storage._lru), ['b.jpg', 'c.jpg'])
+
+    def test_save_and_delete_forget_the_name(self):
+        self.storage.url('doc.txt')
+        self.storage.save('doc.txt', ContentFile(b'x'))
+        self.storage.url('doc.txt')
+        self.storage.delete('doc.txt')
+        self.storage.url('doc.txt')
+        self.assertEqual(self.storage.url_calls, 3)
+
+
+class ImportExportTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.author = User.objects.create_user('editor', password='pass12345')
+        self.path = tempfile.mkstemp(suffix='.jsonl')[1]
+        self.addCleanup(lambda: os.path.exists(self.path) and os.remove(self.path))
+
+    def write_lines(self, records):
+        with open(self.path, 'w', encoding='utf-8') as handle:
+            handle.writelines(json.dumps(record) + '\n' for record in records)
+
+    def import_articles(self, *args):
+        out = StringIO()
+        call_command('import_articles', self.path, *args, stdout=out)
+        return out.getvalue()
+
+    def test_import_batches_slugs_categories_and_derived_fields(self):
+        Category.objects.create(name='Baking')
+        self.write_lines([
+            {'title': 'Weekly update', 'content': 'First <b>post</b>', 'author': 'editor',
+             'status': 'published', 'published_at': '2024-01-02T10:00:00Z',
+             'categories': ['Baking', 'News']},
+            {'title': 'Weekly update', 'content': 'Second post', 'author': 'editor',
+             'categories': ['News']},
+            {'title': 'Sourdough', 'content': 'Starter notes', 'author': 'editor',
+             'status': 'published'},
+        ])
+        output = self.import_articles('--batch-size', '2')
+
+        self.assertIn('Imported 3 article(s)', output)
+        self.assertIn('rows/sec', output)
+        first, second, third = Article.objects.order_by('pk')
+        self.assertEqual((first.slug, second.slug), ('weekly-update', 'weekly-update-2'))
+        self.assertEqual(set(first.categories.values_list('name', flat=True)), {'Baking', 'News'})
+        self.assertEqual(Category.objects.count(), 2)
+        self.assertEqual(first.published_at.year, 2024)
+        self.assertEqual(second.status, Article.DRAFT)
+        self.assertIsNotNone(third.published_at)
+        self.assertIn('&lt;b&gt;', first.content_html)
+        self.assertEqual(first.excerpt, 'First <b>post</b>')
+        self.assertTrue(first.content_hash)
+        self.assertEqual(
+            [a.pk for a in self.client.get(reverse('search'), {'q': 'starter'}).context['results']],
+            [third.pk],
+        )
+
+    def test_import_invalidates_cached_pages(self):
+        self.assertNotContains(self.client.get(reverse('home')), 'Fresh import')
+        self.write_lines([{'title': 'Fresh import', 'content': 'Body', 'author': 'editor',
+                           'status': 'published'}])
+        self.import_articles()
+        self.assertContains(self.client.get(reverse('home')), 'Fresh import')
+
+    def test_bad_line_rolls_back_its_batch(self):
+        self.write_lines([
+            {'title': 'Fine', 'content': 'Body', 'author': 'editor'},
+            {'title': 'Orphan', 'content': 'Body', 'author': 'nobody'},
+        ])
+        with self.assertRaisesMessage(CommandError, "Line 2: unknown author 'nobody'"):
+            self.import_articles()
+        self.assertFalse(Article.objects.exists())
+
+    def test_categories_with_colliding_slugs_get_their_own(self):
+        Category.objects.create(name='C')
+        self.write_lines([
+            {'title': 'Stack', 'content': 'Body', 'author': 'editor',
+             'categories': ['Web Dev', 'web-dev', 'C++', 'C']},
+        ])
+        self.import_articles()
+        self.assertEqual(
+            dict(Category.objects.values_list('name', 'slug')),
+            {'C': 'c', 'C++': 'c-2', 'Web Dev': 'web-dev', 'web-dev': 'web-dev-2'},
+        )
+        self.assertEqual(Article.objects.get().categories.count(), 4)
+
+    def test_exported_slugs_are_kept_when_free(self):
+        Article.objects.create(title='Taken', content='Body', author=self.author)
+        self.write_lines([
+            {'title': 'Renamed since', 'slug': 'original-url', 'content': 'Body', 'author': 'editor'},
+            {'title': 'Original URL', 'content': 'Body', 'author': 'editor'},
+            {'title': 'Clash', 'slug': 'taken', 'content': 'Body', 'author': 'editor'},
+        ])
+        self.import_articles()
+        self.assertEqual(
+            list(Article.objects.order_by('pk').values_list('slug', flat=True)),
+            ['taken', 'original-url', 'original-url-2', 'clash'],
+        )
+
+        self.write_lines([{'title': 'Bad', 'slug': 'Not a slug!', 'content': 'Body', 'author': 'editor'}])
+        with self.assertRaisesMessage(CommandError, "Line 1: invalid slug 'Not a slug!'"):
+            self.import_articles()
+
+    def test_failed_import_reports_committed_batches(self):
+        self.write_lines([
+            {'title': 'First', 'content': 'Body', 'author': 'editor'},
+            {'title': 'Orphan', 'content': 'Body', 'author': 'nobody'},
+        ])
+        with self.assertRaisesMessage(CommandError, "(1 article(s) from earlier batches were committed)"):
+            self.import_articles('--batch-size', '1')
+        self.assertEqual(Article.objects.count(), 1)
+
+        Article.objects.all().delete()
+        with self.assertRaisesMessage(CommandError, "Line 2: unknown author 'nobody'"):
+            self.import_articles('--batch-size', '1', '--atomic')
+        self.assertFalse(Article.objects.exists())
+
+    def test_overlong_title_is_rejected(self):
+        self.write_lines([{'title': 'x' * 201, 'content': 'Body', 'author': 'editor'}])
+        with self.assertRaisesMessage(CommandError, "Line 1: title is longer than 200 characters"):
+            self.import_articles()
+        self.assertFalse(Article.objects.exists())
+
+    def test_export_round_trips_through_import(self):
+        article = Article.objects.create(
+            title='Round trip', content='Body text', author=self.author, status=Article.PUBLISHED,
+        )
+        article.categories.add(Category.objects.create(name='Travel'))
+
+        out, err = StringIO(), StringIO()
+        call_command('export_articles', '--chunk-size', '1', stdout=out, stderr=err)
+        records = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(records, [{
+            'title': 'Round trip', 'slug': 'round-trip', 'author': 'editor',
+            'status': 'published', 'published_at': article.published_at.isoformat(),
+            'categories': ['Travel'], 'content': 'Body text',
+        }])
+        self.assertIn('Exported 1 article(s)', err.getvalue())
+
+        Article.objects.all().delete()
+        with open(self.path, 'w', encoding='utf-8') as handle:
+            handle.write(out.getvalue())
+        self.import_articles()
+        imported = Article.objects.get()
+        self.assertEqual(imported.slug, 'round-trip')
+        self.assertEqual(imported.published_at, article.published_at)
+
+
+class BenchmarkTests(BlogTestCase):
+    def test_seed_run_and_compare(self):
+        benchmark.seed(users=3, categories=2, articles=12, comments=20, likes=15)
+        self.assertEqual(Article.objects.count(), 12)
+        self.assertEqual(Like.objects.count(), 15)
+        self.assertEqual(sum(Article.objects.values_list('comment_count', flat=True)), 20)
+
+        views = benchmark.run(requests=2)
+        self.assertEqual(
+            set(views), {'home', 'article_detail', 'category', 'category_articles', 'search'},
+        )
+        self.assertGreater(views['home']['queries_max'], 0)
+        result = benchmark.report(views, {}, 2, False, False)
+        self.assertEqual(benchmark.compare(result, result), [])
+
+        slower = json.loads(json.dumps(result))
+        slower['views']['home']['p95_ms'] = result['views']['home']['p95_ms'] * 2
+        slower['views']['home']['queries_max'] += 1
+        self.assertEqual(len(benchmark.compare(slower, result, threshold=0.5)), 2)
+
+    def test_percentile_interpolates(self):
+        self.assertEqual(benchmark.percentile([1, 2, 3, 4], 50), 2.5)
+        self.assertEqual(benchmark.percentile([5], 99), 5)
+
+
+@override_settings(REQUEST_METRICS_ENABLED=True, REQUEST_QUERY_BUDGET=50, REQUEST_TIME_BUDGET_MS=60000)
+class RequestMetricsTests(BlogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user('writer', password='pass12345')
+        Article.objects.create(title='Measured', content='Body', author=author, status=Article.PUBLISHED)
+
+    def get_home(self):
+        with self.assertLogs('core.requests', 'INFO') as logs:
+            response = self.client.get(reverse('home'))
+        return response, logs.records[0], json.loads(logs.records[0].getMessage())
+
+    def test_logs_and_headers_request_metrics(self):
+        response, log, record = self.get_home()
+        self.assertEqual(log.levelname, 'INFO')
+        self.assertEqual(record['view'], 'home')
+        self.assertEqual(record['status'], 200)
+        self.assertGreater(record['db_queries'], 0)
+        self.assertGreater(record['template_ms'], 0)
+        self.assertGreater(record['cache_misses'], 0)
+        self.assertEqual(record['over_budget'], [])
+        self.assertIn(f'desc="{record["db_queries"]} queries"', response['Server-Timing'])
+        self.assertIn('total;dur=', response['Server-Timing'])
+
+        # The second request is served from the page cache
+        _, _, cached = self.get_home()
+        self.assertEqual(cached['template_ms'], 0)
+        self.assertGreater(cached['cache_hits'], 0)
+        self.assertLess(cached['db_queries'], record['db_queries'])
+
+    def test_flags_requests_over_budget(self):
+        with self.settings(REQUEST_QUERY_BUDGET=0, REQUEST_TIME_BUDGET_MS=0):
+            _, log, record = self.get_home()
+        self.assertEqual(log.levelname, 'WARNING')
+        self.assertEqual(record['over_budget'], ['queries', 'time'])
+
+    def test_disabled_middleware_is_not_installed(self):
+        with self.settings(REQUEST_METRICS_ENABLED=False):
+            response = self.client_class().get(reverse('home'))
+        self.assertNotIn('Server-Timing', response)
+
+
+class CategoryStatsTests(BlogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        first = User.objects.create_user('first', password='pass12345')
+        second = User.objects.create_user('second', password='pass12345')
+        cls.travel = Category.objects.create(name='Travel')
+        cls.food = Category.objects.create(name='Food')
+        Category.objects.create(name='Empty')
+        for author, status in ((first, Article.PUBLISHED), (first, Article.DRAFT), (second, Article.PUBLISHED)):
+            Article.objects.create(
+                title='Trip', content='Body', author=author, status=status,
+            ).categories.add(cls.travel)
+        Article.objects.create(
+            title='Soup', content='Body', author=second, status=Article.PUBLISHED,
+        ).categories.add(cls.food)
+
+    def stats_queries(self, queries):
+        return [q['sql'] for q in queries if 'COUNT(' in q['sql'] and 'FROM "core_category"' in q['sql']]
+
+    def test_counts_come_from_one_grouped_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('category'))
+        self.assertEqual(len(self.stats_queries(queries)), 1)
+        stats = {c.name: (c.article_count, c.published_count, c.author_count)
+                 for c in response.context['categories']}
+        self.assertEqual(stats, {'Empty': (0, 0, 0), 'Food': (1, 1, 1), 'Travel': (3, 2, 2)})
+        self.assertEqual([c.name for c in response.context['popular_categories']], ['Travel', 'Food'])
+
+    def test_search_filter_is_applied(self):
+        response = self.client.get(reverse('category'), {'search': 'trav'})
+        self.assertEqual([c.name for c in response.context['categories']], ['Travel'])
+        self.assertEqual(len(response.context['popular_categories']), 2)
+
+    def test_home_pills_reuse_the_cached_stats(self):
+        self.client.get(reverse('category'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('home'))
+        self.assertFalse(self.stats_queries(queries))
+        self.assertContains(response, '<span class="pill-count">3</span>', html=True)
+
+    def test_stats_follow_article_changes(self):
+        self.client.get(reverse('category'))
+        Article.objects.create(
+            title='Another', content='Body', author=User.objects.get(username='first'),
+            status=Article.PUBLISHED,
+        ).categories.add(self.food)
+        response = self.client.get(reverse('category'))
+        food = next(c for c in response.context['categories'] if c.name == 'Food')
+        self.assertEqual((food.article_count, food.author_count), (2, 2))
+
+
+class TrendingTests(BlogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.readers = [User.objects.create_user(f'reader{i}', password='pass12345') for i in range(4)]
+        author = cls.readers[0]
+        cls.old_hit = Article.objects.create(title='Old hit', content='Body', author=author, status=Article.PUBLISHED)
+        cls.fresh = Article.objects.create(title='Fresh story', content='Body', author=author, status=Article.PUBLISHED)
+        cls.quiet = Article.objects.create(title='Quiet', content='Body', author=author, status=Article.PUBLISHED)
+        cls.draft = Article.objects.create(title='Draft', content='Body', author=author)
+
+        for reader in cls.readers:
+            Like.objects.create(article=cls.old_hit, user=reader)
+        Like.objects.create(article=cls.fresh, user=cls.readers[1])
+        Comment.objects.create(article=cls.fresh, user=cls.readers[2], body='Great')
+        Like.objects.create(article=cls.draft, user=cls.readers[1])
+        # The old hit's four likes are three half-lives old: worth 0.5
+        Like.objects.filter(article=cls.old_hit).update(created_at=timezone.now() - timedelta(hours=72))
+
+    def test_rebuild_ranks_by_decayed_engagement(self):
+        self.assertEqual(trending.rebuild(), 2)
+        ranking = list(TrendingArticle.objects.values_list('article_id', 'rank'))
+        self.assertEqual(ranking, [(self.fresh.pk, 1), (self.old_hit.pk, 2)])
+        self.assertAlmostEqual(TrendingArticle.objects.get(rank=2).score, 0.5, places=2)
+
+    def test_events_outside_the_window_are_ignored(self):
+        with self.settings(TRENDING_WINDOW_HOURS=48):
+            trending.rebuild()
+        self.assertEqual(list(TrendingArticle.objects.values_list('article_id', flat=True)), [self.fresh.pk])
+
+    def test_home_section_is_a_single_read(self):
+        call_command('compute_trending', stdout=StringIO())
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('home'))
+        self.assertEqual([a.pk for a in response.context['trending']], [self.fresh.pk, self.old_hit.pk])
+        self.assertEqual(len([q for q in queries if 'core_trendingarticle' in q['sql']]), 1)
+
+    def test_trending_page_refreshes_after_rebuild(self):
+        self.assertContains(self.client.get(reverse('trending')), 'Nothing trending yet')
+        trending.rebuild()
+        response = self.client.get(reverse('trending'))
+        self.assertEqual([a.pk for a in response.context['articles']], [self.fresh.pk, self.old_hit.pk])
+
+
+class ConditionalGetTests(BlogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('writer', password='pass12345')
+        cls.reader = User.objects.create_user('reader', password='pass12345')
+        cls.article = Article.objects.create(
+            title='Cached', content='Body', author=cls.author, status=Article.PUBLISHED,
+        )
+
+    def setUp(self):
+        super().setUp()
+        # Give every namespace a known change time, as a running site has
+        with mock.patch('time.time', return_value=time.time() - 60):
+            bump(*NAMESPACES, TRENDING)
+
+    def detail_url(self):
+        return reverse('article_detail', args=[self.article.slug])
+
+    def revalidate(self, url, response):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_unchanged_detail_page_is_304_without_main_queries(self):
+        first = self.client.get(self.detail_url())
+        self.assertIn('ETag', first)
+        self.assertIn('Last-Modified', first)
+        with self.assertNumQueries(0):
+            second = self.revalidate(self.detail_url(), first)
+        self.assertEqual(second.status_code, 304)
+        since = self.client.get(self.detail_url(), HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(since.status_code, 304)
+
+    def test_likes_and_comments_change_the_detail_validators(self):
+        first = self.client.get(self.detail_url())
+        Like.objects.create(article=self.article, user=self.reader)
+        self.assertEqual(self.revalidate(self.detail_url(), first).status_code, 200)
+
+        second = self.client.get(self.detail_url())
+        Comment.objects.create(article=self.article, user=self.reader, body='Nice')
+        self.assertEqual(self.revalidate(self.detail_url(), second).status_code, 200)
+
+    def test_validators_are_per_user(self):
+        anonymous = self.client.get(self.detail_url())
+        self.client.force_login(self.reader)
+        self.client.get(self.detail_url())  # sets the CSRF cookie the forms use
+        mine = self.client.get(self.detail_url())
+        self.assertNotEqual(mine['ETag'], anonymous['ETag'])
+        self.assertNotIn('Last-Modified', mine)
+        self.assertEqual(self.revalidate(self.detail_url(), mine).status_code, 304)
+
+        # Liking changes what this reader sees even if the count is unchanged
+        Like.objects.create(article=self.article, user=self.reader)
+        Article.objects.filter(pk=self.article.pk).update(like_count=0)
+        self.assertEqual(self.revalidate(self.detail_url(), mine).status_code, 200)
+
+        self.client.force_login(self.author)
+        self.assertEqual(self.revalidate(self.detail_url(), mine).status_code, 200)
+
+    def test_list_pages_revalidate_from_cache_versions(self):
+        for url in (reverse('home'), reverse('category_articles', args=[
+                Category.objects.create(name='Misc').slug])):
+            first = self.client.get(url)
+            with self.assertNumQueries(0):
+                self.assertEqual(self.revalidate(url, first).status_code, 304)
+
+        first = self.client.get(reverse('home'))
+        Article.objects.create(title='New', content='Body', author=self.author, status=Article.PUBLISHED)
+        self.assertEqual(self.revalidate(reverse('home'), first).status_code, 200)
+
+    def test_last_modified_is_never_earlier_than_the_change(self):
+        second = math.floor(time.time()) - 10
+        with mock.patch('time.time', return_value=second + 0.2):
+            bump(*NAMESPACES)
+        with mock.patch('time.time', return_value=second + 0.5):
+            self.assertNotIn('Last-Modified', self.client.get(self.detail_url()))
+        with mock.patch('time.time', return_value=second + 1.5):
+            first = self.client.get(self.detail_url())
+        self.assertEqual(first['Last-Modified'], http_date(second + 1))
+
+        with mock.patch('time.time', return_value=second + 1.7):
+            bump(ARTICLES)
+            since = self.client.get(self.detail_url(), HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(since.status_code, 200)
+
+    def test_missing_article_is_still_404(self):
+        response = self.client.get(reverse('article_detail', args=['missing']), HTTP_IF_NONE_MATCH='"x"')
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(ROOT_URLCONF='blog.asgi_urls')
+class AsyncViewTests(BlogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('writer', password='pass12345')
+        cls.category = Category.objects.create(name='Baking')
+        cls.article = Article.objects.create(
+            title='Sourdough', content='Body', author=cls.author, status=Article.PUBLISHED,
+        )
+        cls.article.categories.add(cls.category)
+        reply_to = Comment.objects.create(article=cls.article, user=cls.author, body='First!')
+        Comment.objects.create(article=cls.article, user=cls.author, body='Reply', parent=reply_to)
+        TrendingArticle.objects.create(article=cls.article, rank=1, score=1.0, computed_at=timezone.now())
+
+    def urls(self):
+        return [
+            reverse('home'),
+            reverse('article_detail', args=[self.article.slug]),
+            reverse('category'),
+            reverse('category_articles', args=[self.category.slug]),
+            reverse('about'),
+        ]
+
+    def test_read_only_pages_resolve_to_async_views(self):
+        self.assertIs(resolve(reverse('home')).func, async_views.home)
+        self.assertIs(resolve(reverse('about')).func, async_views.about_page)
+        self.assertEqual(resolve(reverse('search')).url_name, 'search')
+
+    async def test_async_pages_match_the_sync_pages(self):
+        for url in self.urls():
+            with self.subTest(url=url):
+                await cache.aclear()
+                response = await self.async_client.get(url)
+                self.assertEqual(response.status_code, 200)
+                with override_settings(ROOT_URLCONF='blog.urls'):
+                    await cache.aclear()
+                    expected = await self.async_client.get(url)
+                self.assertEqual(response.content, expected.content)
+
+    async def test_anonymous_pages_are_cached_and_revalidated(self):
+        url = reverse('article_detail', args=[self.article.slug])
+        first = await self.async_client.get(url)
+        self.assertContains(first, 'Reply')
+        second = await self.async_client.get(url, headers={'if-none-match': first['ETag']})
+        self.assertEqual(second.status_code, 304)
+
+        await Comment.objects.acreate(article=self.article, user=self.author, body='Late comment')
+        third = await self.async_client.get(url, headers={'if-none-match': first['ETag']})
+        self.assertContains(third, 'Late comment')
+
+    async def test_logged_in_reader_sees_own_like(self):
+        await self.async_client.aforce_login(self.author)
+        await Like.objects.acreate(article=self.article, user=self.author)
+        response = await self.async_client.get(reverse('article_detail', args=[self.article.slug]))
+        self.assertTrue(response.context['liked'])
+        self.assertContains(response, 'Edit')
+        self.assertNotIn('Last-Modified', response)
+
+    async def test_unknown_slugs_are_404(self):
+        response = await self.async_client.get(reverse('category_articles', args=['missing']))
+        self.assertEqual(response.status_code, 404)
+        response = await self.async_client.get(reverse('article_detail', args=['missing']))
+        self.assertEqual(response.status_code, 404)
+
+
+class ServingBenchmarkTests(TransactionTestCase):
+    # The handlers serve from their own threads, which only see committed rows
+    def setUp(self):
+        cache.clear()
+
+    def test_both_handlers_serve_the_pages(self):
+        benchmark.seed(users=2, categories=2, articles=6, comments=6, likes=4)
+        urls = benchmark.serving_urls()
+        self.assertTrue(urls)
+        for summary in (benchmark.serve_wsgi(urls, 4, 2), benchmark.serve_asgi(urls, 4, 2)):
+            self.assertEqual(summary['requests'], 4)
+            self.assertEqual(summary['errors'], 0)
+            self.assertGreater(summary['throughput_rps'], 0)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'], DATABASE_ROUTERS=['core.routers.ReplicaRouter'])
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    Two SQLite databases: the test database as primary and a migrated file
+    as the replica. Rows are copied to the replica by hand, so anything
+    written afterwards shows up as replication lag.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.tmpdir = tempfile.mkdtemp()
+        # Attached to this thread only, outside settings.DATABASES, so the
+        # test runner neither creates nor guards it
+        connections['replica'] = SQLiteDatabaseWrapper({
+            **connections['default'].settings_dict,
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(cls.tmpdir, 'replica.sqlite3'),
+            'OPTIONS': {},
+        }, alias='replica')
+        with override_settings(DATABASE_ROUTERS=[]):
+            call_command('migrate', database='replica', verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        connections['replica'].close()
+        del connections['replica']
+        shutil.rmtree(cls.tmpdir)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        routers._down_until.clear()
+        self.author = User.objects.create_user('writer', password='pass12345')
+        self.article = Article.objects.create(
+            title='Replicated', content='Body', author=self.author, status=Article.PUBLISHED,
+        )
+        User.objects.using('replica').bulk_create([self.author])
+        Article.objects.using('replica').bulk_create([self.article])
+        self.url = reverse('article_detail', args=[self.article.slug])
+
+    def tearDown(self):
+        # The router keeps flush (like migrate) off replicas
+        with override_settings(DATABASE_ROUTERS=[]):
+            call_command('flush', database='replica', interactive=False, verbosity=0)
+
+    def test_anonymous_reads_go_to_the_replica(self):
+        with CaptureQueriesContext(connections['replica']) as replica, \
+                CaptureQueriesContext(connection) as primary:
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.assertTrue(any('core_article' in query['sql'] for query in replica.captured_queries))
+        self.assertFalse(any('core_article' in query['sql'] for query in primary.captured_queries))
+
+    def test_writers_read_their_own_writes_from_the_primary(self):
+        self.client.force_login(self.author)
+        response = self.client.post(reverse('toggle_like', args=[self.article.slug]))
+        self.assertIn(routers.PIN_COOKIE, response.cookies)
+
+        self.assertEqual(self.client.get(self.url).context['total_likes'], 1)
+        # Everyone else reads the lagging replica
+        other = self.client_class()
+        self.assertEqual(other.get(self.url).context['total_likes'], 0)
+
+    def test_writes_pin_the_rest_of_the_request(self):
+        router = routers.ReplicaRouter()
+        with routers.request_pin():
+            self.assertEqual(router.db_for_read(Article), 'replica')
+            self.assertEqual(router.db_for_read(User), 'default')
+            self.assertEqual(router.db_for_write(Comment), 'default')
+            self.assertEqual(router.db_for_read(Article), 'default')
+        with routers.request_pin(pinned=True):
+            self.assertEqual(router.db_for_read(Article), 'default')
+        self.assertFalse(router.allow_migrate('replica', 'core'))
+
+    def test_writes_outside_requests_pin_for_a_while(self):
+        router = routers.ReplicaRouter()
+
+        def command():
+            router.db_for_write(Comment)
+            self.assertEqual(router.db_for_read(Article), 'default')
+            later = time.monotonic() + settings.DATABASE_PRIMARY_PIN_SECONDS
+            with mock.patch('time.monotonic', return_value=later):
+                self.assertEqual(router.db_for_read(Article), 'replica')
+
+        contextvars.copy_context().run(command)
+
+    def test_open_replica_connections_are_rechecked(self):
+        replica = connections['replica']
+        self.assertEqual(routers.healthy_replica(), 'replica')
+        name = replica.settings_dict['NAME']
+        replica.settings_dict['NAME'] = os.path.join(self.tmpdir, 'missing', 'replica.sqlite3')
+        try:
+            with mock.patch.object(replica, 'is_usable', return_value=False):
+                # Trusted until the next check is due
+                self.assertEqual(routers.healthy_replica(), 'replica')
+                later = time.monotonic() + settings.DATABASE_REPLICA_CHECK_SECONDS
+                with mock.patch('time.monotonic', return_value=later), \
+                        self.assertLogs('core.routers', 'WARNING'):
+                    self.assertIsNone(routers.healthy_replica())
+        finally:
+            replica.settings_dict['NAME'] = name
+
+    def test_unreachable_replica_falls_back_to_the_primary(self):
+        replica = connections['replica']
+        name = replica.settings_dict['NAME']
+        replica.close()
+        replica.settings_dict['NAME'] = os.path.join(self.tmpdir, 'missing', 'replica.sqlite3')
+        try:
+            with self.assertLogs('core.routers', 'WARNING'):
+                self.assertEqual(self.client.get(self.url).status_code, 200)
+            # Not retried until DATABASE_REPLICA_RETRY_SECONDS have passed
+            with self.assertNoLogs('core.routers', 'WARNING'):
+                self.assertIsNone(routers.healthy_replica())
+        finally:
+            replica.settings_dict['NAME'] = name
+
+
+@override_settings(DATABASE_POOL_METRICS_TOKEN='s3cret')
+class PoolStatsTests(BlogTestCase):
+    def test_requires_staff_or_token(self):
+        url = reverse('db_pool_stats')
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.get(url, headers={'authorization': 'Bearer wrong'}).status_code, 404)
+
+        response = self.client.get(url, headers={'authorization': 'Bearer s3cret'})
+        self.assertEqual(response.json()['pid'], os.getpid())
+        # SQLite is never pooled
+        self.assertEqual(response.json()['pools'], {})
+
+        staff = User.objects.create_user('ops', password='pass12345', is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+
+purged = []
+
+
+def record_purge(tags):
+    purged.append(set(tags))
+
+
+@override_settings(CDN_CACHE_SECONDS=60, CDN_PURGE_BACKEND='core.tests.record_purge')
+class SharedCacheTests(BlogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('writer', password='pass12345')
+        cls.category = Category.objects.create(name='Travel')
+        cls.article = Article.objects.create(
+            title='Shared', content='Body', author=cls.author, status=Article.PUBLISHED,
+        )
+        cls.article.categories.add(cls.category)
+
+    def setUp(self):
+        super().setUp()
+        purged.clear()
+
+    def test_anonymous_pages_are_public_and_tagged(self):
+        for url in (reverse('home'), reverse('category'), reverse('category_articles', args=[self.category.slug]),
+                    reverse('article_detail', args=[self.article.slug])):
+            response = self.client.get(url)
+            self.assertIn('public', response['Cache-Control'])
+            self.assertIn('s-maxage=60', response['Cache-Control'])
+            self.assertIn('articles', response['Surrogate-Key'].split())
+            self.assertNotIn('Cookie', response.get('Vary', ''))
+            self.assertNotIn('name="csrfmiddlewaretoken"', response.content.decode())
+            self.assertFalse(response.cookies)
+
+    def test_logged_in_pages_are_private(self):
+        self.client.force_login(self.author)
+        response = self.client.get(reverse('article_detail', args=[self.article.slug]))
+        self.assertIn('private', response['Cache-Control'])
+        self.assertNotIn('Surrogate-Key', response)
+        # Forms only render on these private pages, so they keep their token
+        self.assertContains(response, 'name="csrfmiddlewaretoken"', count=2)
+
+    def test_missing_page_is_not_shared(self):
+        response = self.client.get(reverse('article_detail', args=['missing']))
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn('public', response.get('Cache-Control', ''))
+
+    def test_writes_queue_their_tags_for_one_purge(self):
+        self.article.title = 'Renamed'
+        self.article.save()
+        Like.objects.create(article=self.article, user=self.author)
+        Like.objects.create(article=Article.objects.create(title='Other', content='Body', author=self.author),
+                            user=self.author)
+        self.assertFalse(purged)
+
+        out = StringIO()
+        call_command('run_cdn_purger', '--once', stdout=out)
+        self.assertEqual(len(purged), 1)
+        self.assertTrue({'articles', 'likes'} <= purged[0])
+        self.assertIn('likes', out.getvalue())
+        self.assertFalse(PendingPurge.objects.exists())
+
+        call_command('run_cdn_purger', '--once', stdout=StringIO())
+        self.assertEqual(len(purged), 1)
+
+    def test_failed_purge_is_queued_again(self):
+        Comment.objects.create(article=self.article, user=self.author, body='Hi')
+        with override_settings(CDN_PURGE_BACKEND='core.tests.missing_backend'), \
+                self.assertLogs('core.cdn', 'ERROR'), self.assertRaises(ImportError):
+            call_command('run_cdn_purger', '--once', stdout=StringIO())
+        self.assertIn('comments', PendingPurge.objects.values_list('tag', flat=True))
+
+        call_command('run_cdn_purger', '--once', stdout=StringIO())
+        self.assertIn('comments', purged[0])
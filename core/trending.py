@@ -0,0 +1,85 @@
+"""
+Trending articles: published articles scored by recent engagement.
+
+Every like and comment from the last TRENDING_WINDOW_HOURS adds its weight,
+halved for every TRENDING_HALF_LIFE_HOURS of age. ``rebuild()`` runs from
+manage.py compute_trending and swaps the result into TrendingArticle, so
+pages only ever read the stored ranking.
+"""
+import math
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from . import cache
+from .models import Article, Comment, Like, TrendingArticle
+
+
+def decay(age, half_life):
+    return math.pow(0.5, age.total_seconds() / half_life.total_seconds())
+
+
+def compute_scores(now=None):
+    """``{article_id: score}`` for every published article with recent engagement"""
+    now = now or timezone.now()
+    since = now - timedelta(hours=settings.TRENDING_WINDOW_HOURS)
+    half_life = timedelta(hours=settings.TRENDING_HALF_LIFE_HOURS)
+
+    scores = defaultdict(float)
+    for model, weight in ((Like, settings.TRENDING_LIKE_WEIGHT),
+                          (Comment, settings.TRENDING_COMMENT_WEIGHT)):
+        events = (
+            model.objects
+            .filter(created_at__gte=since, article__status=Article.PUBLISHED)
+            .values_list('article_id', 'created_at')
+        )
+        for article_id, created_at in events.iterator(chunk_size=2000):
+            scores[article_id] += weight * decay(now - created_at, half_life)
+    return scores
+
+
+def rebuild(size=None, now=None):
+    """Replace the stored ranking with the current top ``size`` articles"""
+    now = now or timezone.now()
+    size = size or settings.TRENDING_SIZE
+    scores = compute_scores(now)
+    top = sorted(scores.items(), key=lambda item: (-item[1], -item[0]))[:size]
+
+    with transaction.atomic():
+        TrendingArticle.objects.all().delete()
+        TrendingArticle.objects.bulk_create([
+            TrendingArticle(article_id=article_id, rank=rank, score=score, computed_at=now)
+            for rank, (article_id, score) in enumerate(top, 1)
+        ])
+    cache.bump(cache.TRENDING)
+    return len(top)
+
+
+def _ranking(limit):
+    rows = (
+        TrendingArticle.objects
+        .filter(article__status=Article.PUBLISHED)
+        .select_related('article__author__profile')
+        .defer('article__content')
+        .order_by('rank')
+    )
+    return rows[:limit] if limit else rows
+
+
+def _cards(rows):
+    articles = []
+    for row in rows:
+        row.article.trending_score = row.score
+        articles.append(row.article)
+    return articles
+
+
+def trending_articles(limit=None):
+    """The ranked articles, ready for cards, from one indexed read"""
+    return _cards(_ranking(limit))
+
+
+async def atrending_articles(limit=None):
+    return _cards([row async for row in _ranking(limit)])
@@ -13,5 +13,8 @@ urlpatterns = [
     path('like/<slug:article_slug>/', views.toggle_like, name='toggle_like'),
     path('category/', views.category, name='category'),
     path('category/<slug:slug>/', views.category_articles, name='category_articles'),
+    path('search/', views.search, name='search'),
+    path('trending/', views.trending, name='trending'),
     path('about/', views.about_page, name='about'),
+    path('metrics/db-pool/', views.db_pool_stats, name='db_pool_stats'),
 ]
\ No newline at end of file
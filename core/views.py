@@ -1,39 +1,84 @@
 # views.py
+import os
+
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.core.paginator import Paginator
+from django.db import IntegrityError, transaction
+from django.http import Http404, JsonResponse
+from django.utils.crypto import constant_time_compare
 from django.views.decorators.http import require_POST
-from django.db.models import Q, Count
+from . import cache, conditional
+from .cache import cache_anonymous_page
 from .models import Article, Category, Comment, Like
+from .pagination import CursorPaginator, capped_count, get_per_page
+from .pool import pool_stats
+from .search import search_articles
+from .trending import trending_articles
+
+POPULAR_CATEGORIES = 6
+
+
+def category_stats():
+    """Every category, by name, with its article, published and author counts"""
+    return cache.cached_value(
+        'category-stats', (cache.ARTICLES, cache.CATEGORIES),
+        lambda: list(Category.objects.with_stats().order_by('name')),
+    )
 
+
+@conditional.list_page(cache.ARTICLES, cache.CATEGORIES, cache.LIKES, cache.PROFILES, cache.TRENDING)
+@cache_anonymous_page(cache.ARTICLES, cache.CATEGORIES, cache.LIKES, cache.PROFILES, cache.TRENDING)
 def home(request):
     category_slug = request.GET.get('category')
-    articles = Article.objects.filter(status=Article.PUBLISHED).order_by('-published_at')
+    articles = Article.objects.published().feed()
     
     if category_slug:
         category = get_object_or_404(Category, slug=category_slug)
         articles = articles.filter(categories=category)
     
-    categories = Category.objects.annotate(num_articles=Count('article'))
+    page = CursorPaginator(articles, per_page=get_per_page(request)).page(
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
+    articles_count, articles_count_capped = capped_count(articles)
+    
+    first_page = not (category_slug or page.has_previous)
     
     context = {
-        'articles': articles,
-        'categories': categories,
+        'articles': page.object_list,
+        'page': page,
+        'articles_count': articles_count,
+        'articles_count_capped': articles_count_capped,
+        'trending': trending_articles(settings.TRENDING_HOME_SIZE) if first_page else [],
+        # Passed uncalled: the template only calls it when the cached
+        # category pills fragment has to be re-rendered
+        'categories': category_stats,
         'selected_category': category_slug
     }
     return render(request, 'blog/article_list.html', context)
 
 
+@conditional.article_page(cache.ARTICLES, cache.COMMENTS, cache.LIKES, cache.PROFILES)
+@cache_anonymous_page(cache.ARTICLES, cache.COMMENTS, cache.LIKES, cache.PROFILES)
 def article_detail(request, slug):
-    article = get_object_or_404(Article, slug=slug, status=Article.PUBLISHED)
-    comments = article.comments.filter(parent=None).order_by('created_at')
+    article = get_object_or_404(
+        Article.objects.published().select_related('author__profile').defer('content'),
+        slug=slug,
+    )
+    threads = article.comments.tree(max_depth=settings.COMMENT_THREAD_MAX_DEPTH)
+    comments = Paginator(threads, settings.COMMENT_THREADS_PER_PAGE).get_page(
+        request.GET.get('comments_page')
+    )
     liked = article.likes.filter(user=request.user.id).exists() if request.user.is_authenticated else False
     
     context = {
         'article': article,
         'comments': comments,
         'liked': liked,
-        'total_likes': article.likes.count()
+        'total_likes': article.like_count
     }
     return render(request, 'blog/article_detail.html', context)
 
@@ -125,7 +170,7 @@ def add_comment(request, article_slug):
         )
         
         if parent_id:
-            parent_comment = get_object_or_404(Comment, id=parent_id)
+            parent_comment = get_object_or_404(Comment, id=parent_id, article=article)
             comment.parent = parent_comment
         
         comment.save()
@@ -147,40 +192,55 @@ def delete_comment(request, comment_id):
 @login_required
 @require_POST
 def toggle_like(request, article_slug):
-    article = get_object_or_404(Article, slug=article_slug)
-    like, created = Like.objects.get_or_create(
-        article=article,
-        user=request.user
+    """
+    Like, or unlike if the like already exists. The insert is attempted
+    first and the unique constraint decides, so concurrent clicks cannot
+    race a separate existence check.
+    """
+    article_id = (
+        Article.objects.filter(slug=article_slug)
+        .values_list('id', flat=True)
+        .first()
     )
+    if article_id is None:
+        raise Http404("No Article matches the given query.")
     
-    if not created:
-        like.delete()
-        messages.info(request, 'Removed like')
-    else:
+    try:
+        with transaction.atomic():
+            Like.objects.create(article_id=article_id, user=request.user)
+        liked = True
+    except IntegrityError:
+        like = Like.objects.filter(article_id=article_id, user=request.user).first()
+        if like is not None:
+            like.remove()
+        liked = False
+    
+    if request.get_preferred_type(['text/html', 'application/json']) == 'application/json':
+        count = Article.objects.filter(pk=article_id).values_list('like_count', flat=True).get()
+        return JsonResponse({'liked': liked, 'count': count})
+    
+    if liked:
         messages.success(request, 'Liked article!')
+    else:
+        messages.info(request, 'Removed like')
     
     return redirect('article_detail', slug=article_slug)
 
 
+@cache_anonymous_page(cache.ARTICLES, cache.CATEGORIES)
 def category(request):
     """Display all categories with search functionality"""
-    search_query = request.GET.get('search', '')    
-    categories = Category.objects.all()
+    search_query = request.GET.get('search', '').strip()
+    stats = category_stats()
     
+    categories = stats
     if search_query:
-        categories = categories.filter(
-            Q(name__icontains=search_query)
-        )
-    
-    categories = Category.objects.annotate(
-        article_count=Count('article'),  
-        author_count=Count('article__author', distinct=True),  
-        published_count=Count('article', filter=Q(article__status='published')) 
-    ).order_by('name')
+        needle = search_query.casefold()
+        categories = [c for c in stats if needle in c.name.casefold()]
     
-    popular_categories = Category.objects.annotate(
-        article_count=Count('article')
-    ).filter(article_count__gt=0).order_by('-article_count')[:6]
+    popular_categories = sorted(
+        (c for c in stats if c.article_count), key=lambda c: -c.article_count,
+    )[:POPULAR_CATEGORIES]
     
     context = {
         'categories': categories,
@@ -190,22 +250,72 @@ def category(request):
     
     return render(request, 'blog/category_list.html', context)
 
+@conditional.list_page(cache.ARTICLES, cache.CATEGORIES, cache.LIKES, cache.PROFILES)
+@cache_anonymous_page(cache.ARTICLES, cache.CATEGORIES, cache.LIKES, cache.PROFILES)
 def category_articles(request, slug):
     """Display articles for a specific category"""
     category = get_object_or_404(Category, slug=slug)
     
-    articles = Article.objects.filter(
-        categories=category, 
-        status=Article.PUBLISHED
-    ).order_by('-published_at')
+    articles = Article.objects.published().feed().filter(categories=category)
+    
+    page = CursorPaginator(articles, per_page=get_per_page(request)).page(
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
+    articles_count, articles_count_capped = capped_count(articles)
     
     context = {
         'category': category,
-        'articles': articles,
-        'articles_count': articles.count(),
+        'articles': page.object_list,
+        'page': page,
+        'articles_count': articles_count,
+        'articles_count_capped': articles_count_capped,
     }
     
     return render(request, 'blog/category_article.html', context)
 
+@cache_anonymous_page(cache.ARTICLES, cache.LIKES, cache.PROFILES)
+def search(request):
+    """Published articles ranked by how well title and content match ``q``"""
+    query = request.GET.get('q', '')
+    try:
+        page = max(1, int(request.GET.get('page', 1)))
+    except ValueError:
+        page = 1
+    
+    results, has_next = search_articles(query, page, settings.SEARCH_RESULTS_PER_PAGE)
+    
+    context = {
+        'query': query,
+        'results': results,
+        'page': page,
+        'has_next': has_next,
+        'has_previous': page > 1,
+    }
+    return render(request, 'blog/search.html', context)
+
+@cache_anonymous_page(cache.ARTICLES, cache.LIKES, cache.PROFILES, cache.TRENDING)
+def trending(request):
+    """Published articles ranked by recent likes and comments"""
+    return render(request, 'blog/trending.html', {
+        'articles': trending_articles(settings.TRENDING_SIZE),
+    })
+
 def about_page(request):
-    return render(request, 'blog/about.html')
\ No newline at end of file
+    return render(request, 'blog/about.html')
+
+def db_pool_stats(request):
+    """
+    Connection pool usage of the worker process that answers, for staff or
+    for monitoring with ``Authorization: Bearer <DATABASE_POOL_METRICS_TOKEN>``
+    """
+    token = settings.DATABASE_POOL_METRICS_TOKEN
+    if not (request.user.is_staff or token and constant_time_compare(
+            request.headers.get('Authorization', ''), f"Bearer {token}")):
+        raise Http404
+    return JsonResponse({
+        'pid': os.getpid(),
+        'pooling': settings.DATABASE_POOL_ENABLED,
+        'pools': pool_stats(),
+    })
+